@@ -0,0 +1,52 @@
+"""
+Messages insert and range-delete throughput against the configured database
+
+Run before and after `main.py --migrate` to compare schemas:
+    python -m benchmarks.messages [rows]
+"""
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta
+
+import config
+
+config.token = config.test_token  # libs imports the bot instance
+
+from libs.database import Database
+
+CHAT_ID = -1
+USER_ID = -1
+
+
+async def main(rows: int):
+    database = Database(config.sql_user, config.sql_password, config.sql_host, config.sql_database)
+    await database.get_user(USER_ID)
+    await database.get_chat(CHAT_ID, USER_ID)
+
+    now = datetime.now()
+    messages = [
+        dict(user_id=USER_ID, chat_id=CHAT_ID, message_id=n, message="benchmark", type="text",
+             date=now - timedelta(seconds=n))
+        for n in range(rows)
+    ]
+
+    start = time.perf_counter()
+    await database.add_messages_many(messages)
+    insert = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await database.delete_messages(chat_id=CHAT_ID, delta=timedelta(seconds=rows // 2))
+    await database.delete_messages(chat_id=CHAT_ID)
+    delete = time.perf_counter() - start
+
+    await database.delete_chats(id=CHAT_ID)
+    await database.delete_users(id=USER_ID)
+    await database.close()
+
+    print(f"insert: {rows / insert:.0f} rows/s ({insert:.3f}s)")
+    print(f"range delete: {rows / delete:.0f} rows/s ({delete:.3f}s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000))
@@ -0,0 +1,43 @@
+"""
+Row object memory and construction time, no database needed:
+    python -m benchmarks.rows [rows]
+"""
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import config
+
+config.token = config.test_token  # libs imports the bot instance
+
+from libs.database import messageOBJ, userOBJ, objects
+
+
+def measure(name: str, rows: list[tuple], o: type, read: str | None = None):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = objects(rows, o)
+    if read:
+        for obj in result:
+            getattr(obj, read)
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"{name}: {elapsed:.3f}s, {memory / 1024 ** 2:.1f} MiB, {memory / len(rows):.0f} B/row")
+    return result
+
+
+def main(count: int):
+    now = datetime.now()
+    messages = [(n, -1, n, None, "benchmark", 1, now) for n in range(count)]
+    users = [(n, '{"lang": "en", "text_alias": {"hi": "/ban"}}', "{}") for n in range(count)]
+
+    measure(f"{count} messageOBJ", messages, messageOBJ)
+    measure(f"{count} userOBJ", users, userOBJ)
+    measure(f"{count} userOBJ, settings read", users, userOBJ, "settings")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
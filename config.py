@@ -12,4 +12,6 @@ sql_user = "{sql_user}"  # MySQL user
 sql_password = "{sql_password}"  # MySQL password from user
 sql_database = "{sql_database}"  # MySQL database name
 
+owner_id = "{owner_id}"  # telegram id of the bot operator, the only one allowed to run /cache and /queries
+
 bot: User
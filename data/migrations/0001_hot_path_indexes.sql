@@ -0,0 +1,11 @@
+-- Composite indexes for get_messages(user_id, chat_id, delta), per-chat message lookups
+-- and report counting. The new indexes start with chat_id, so they also back the
+-- chat_id foreign keys and the single-column keys can be dropped.
+
+CREATE INDEX Messages_chat_id_user_id_date_index ON Messages (chat_id, user_id, date);
+CREATE INDEX Messages_chat_id_message_id_index ON Messages (chat_id, message_id);
+DROP INDEX Messages_Chats_id_fk ON Messages;
+
+ALTER TABLE Logs MODIFY type varchar(32) COLLATE utf8mb4_unicode_ci NOT NULL;
+CREATE INDEX Logs_chat_id_target_id_type_date_index ON Logs (chat_id, target_id, type, date);
+DROP INDEX Logs_Chats_id_fk ON Logs;
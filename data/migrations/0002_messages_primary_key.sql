@@ -0,0 +1,47 @@
+-- Cluster Messages by (chat_id, message_id) and store type as a small integer code
+-- (libs.database.MESSAGE_TYPES). The table is rebuilt, so duplicate
+-- (chat_id, message_id) rows left by the old keyless schema are collapsed.
+
+RENAME TABLE Messages TO Messages_old;
+ALTER TABLE Messages_old DROP FOREIGN KEY Messages_Chats_id_fk, DROP FOREIGN KEY Messages_Users_id_fk;
+
+CREATE TABLE Messages (
+  user_id bigint(20) NOT NULL,
+  chat_id bigint(20) NOT NULL,
+  message_id bigint(20) NOT NULL,
+  reply_message_id bigint(20) DEFAULT NULL,
+  message text COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  type tinyint(3) unsigned NOT NULL,
+  date datetime NOT NULL,
+  PRIMARY KEY (chat_id, message_id),
+  KEY Messages_chat_id_user_id_date_index (chat_id, user_id, date),
+  KEY Messages_Users_id_fk (user_id),
+  CONSTRAINT Messages_Chats_id_fk FOREIGN KEY (chat_id) REFERENCES Chats (id) ON DELETE CASCADE,
+  CONSTRAINT Messages_Users_id_fk FOREIGN KEY (user_id) REFERENCES Users (id) ON DELETE CASCADE
+) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+INSERT IGNORE INTO Messages (user_id, chat_id, message_id, reply_message_id, message, type, date)
+SELECT user_id, chat_id, message_id, reply_message_id, message,
+       CASE type
+           WHEN 'text' THEN 1
+           WHEN 'animation' THEN 2
+           WHEN 'audio' THEN 3
+           WHEN 'contact' THEN 4
+           WHEN 'dice' THEN 5
+           WHEN 'document' THEN 6
+           WHEN 'game' THEN 7
+           WHEN 'location' THEN 8
+           WHEN 'photo' THEN 9
+           WHEN 'poll' THEN 10
+           WHEN 'sticker' THEN 11
+           WHEN 'venue' THEN 12
+           WHEN 'video' THEN 13
+           WHEN 'video_note' THEN 14
+           WHEN 'voice' THEN 15
+           ELSE 0
+       END,
+       date
+FROM Messages_old
+ORDER BY chat_id, message_id;
+
+DROP TABLE Messages_old;
@@ -0,0 +1,8 @@
+-- Partition Messages by day of date (libs.retention), expired days are dropped whole
+-- instead of deleted row by row. Partitioned tables can not have foreign keys and every
+-- unique key must contain the partitioning column, so date joins the primary key.
+-- Everything starts in pmax, the retention task splits it into days on its first run.
+
+ALTER TABLE Messages DROP FOREIGN KEY Messages_Chats_id_fk, DROP FOREIGN KEY Messages_Users_id_fk;
+ALTER TABLE Messages DROP PRIMARY KEY, ADD PRIMARY KEY (chat_id, message_id, date);
+ALTER TABLE Messages PARTITION BY RANGE (TO_DAYS(date)) (PARTITION pmax VALUES LESS THAN MAXVALUE);
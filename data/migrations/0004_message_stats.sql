@@ -0,0 +1,17 @@
+-- Per chat/day/user/type message counters (libs.batch.RollupWriter), /stats reads these
+-- instead of scanning Messages. Existing messages are counted once here.
+
+CREATE TABLE MessageStats (
+  chat_id bigint(20) NOT NULL,
+  day date NOT NULL,
+  user_id bigint(20) NOT NULL,
+  type tinyint(3) unsigned NOT NULL,
+  count int(10) unsigned NOT NULL,
+  PRIMARY KEY (chat_id, day, user_id, type),
+  KEY MessageStats_user_id_day_index (user_id, day)
+) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+INSERT INTO MessageStats (chat_id, day, user_id, type, count)
+SELECT chat_id, DATE(date), user_id, type, COUNT(*)
+FROM Messages
+GROUP BY chat_id, DATE(date), user_id, type;
@@ -0,0 +1,18 @@
+-- Full-text search over message texts. Partitioned tables can not have FULLTEXT indexes,
+-- so texts are kept in their own table, filled on ingestion and trimmed by libs.retention.
+
+CREATE TABLE MessageSearch (
+  chat_id bigint(20) NOT NULL,
+  message_id bigint(20) NOT NULL,
+  user_id bigint(20) NOT NULL,
+  date datetime NOT NULL,
+  message text COLLATE utf8mb4_unicode_ci NOT NULL,
+  PRIMARY KEY (chat_id, message_id),
+  KEY MessageSearch_date_index (date),
+  FULLTEXT KEY MessageSearch_message_fulltext (message)
+) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+INSERT IGNORE INTO MessageSearch (chat_id, message_id, user_id, date, message)
+SELECT chat_id, message_id, user_id, date, message
+FROM Messages
+WHERE message IS NOT NULL AND message <> '';
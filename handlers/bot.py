@@ -21,7 +21,7 @@ async def bot_chat_removed(upd: t.ChatMemberUpdated):
     """
     If bot removed in the chat
     """
-    Database.delete_chat(upd.chat.id)
+    await Database.delete_chats(id=upd.chat.id)
 
 
 @dp.my_chat_member_handler(f.user.promote_admin, f.message.is_chat)
@@ -2,3 +2,4 @@ from . import poll
 from . import purge
 from . import reports
 from . import restrict
+from . import search
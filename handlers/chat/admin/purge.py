@@ -10,7 +10,7 @@ from libs.user import User
 from locales import other, text, buttons
 from src import filters as f
 from src import utils as u
-from src.instances import Database
+from src.instances import Analytics, Database, MessageWriter
 
 
 @other.parsers.purge(
@@ -46,15 +46,11 @@ async def purge(msg: t.Message, parsed: ParsedArgs):
 async def clear_history(msg: t.Message, parsed: ParsedArgs):
     parsed.targets: list[User]
     parsed.time: timedelta
-    messages = []
 
     await u.raise_permissions_errors(parsed.targets, await msg.chat.get_administrators())
     if parsed.targets:
-        for user in parsed.targets:
-            messages += [
-                m.message_id for m in
-                Database.get_messages(user_id=user.id, chat_id=msg.chat.id, delta=parsed.time)
-            ]
+        await MessageWriter.flush()
+        messages = await Database.get_message_ids(msg.chat.id, [user.id for user in parsed.targets], parsed.time)
 
         await process_purge(messages)
         await msg.answer(
@@ -65,15 +61,14 @@ async def clear_history(msg: t.Message, parsed: ParsedArgs):
         )
 
 
-async def process_purge(message_ids: list[User]):
+async def process_purge(message_ids: list[int]):
     if not message_ids:
         return
     chat_id = t.Chat.get_current().id
 
-    Database.disable_autocommit()
-    for id in message_ids:
-        Database.delete_messages(chat_id=chat_id, message_id=id)
-    Database.enable_autocommit()
+    async with Database.transaction():
+        await Database.delete_messages(chat_id=chat_id, message_id=message_ids)
+    Analytics.drop(chat_id)  # loaded again without the purged rows
 
     for ids in u.break_list_by_step(message_ids, 100):
         try:
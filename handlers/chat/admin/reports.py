@@ -29,9 +29,22 @@ async def report(msg: t.Message, parsed: ParsedArgs):
     restrict = []
 
     await u.raise_permissions_errors(parsed.targets, await msg.chat.get_administrators())
+    if parsed.targets:
+        # the count is read on the connection that wrote the reports, both in one commit
+        async with Database.transaction():
+            await Database.add_logs_many([
+                dict(chat_id=chat.id, executor_id=msg.from_user.id, target_id=user.id, type=l.REPORT, date=msg.date)
+                for user in parsed.targets
+            ])
+            counts = await Database.count_logs_by_target(
+                [user.id for user in parsed.targets],
+                chat_id=chat.id,
+                type=l.REPORT,
+                delta=chat.report_delta
+            )
+
     for user in parsed.targets:
-        Database.add_log(chat.id, msg.from_user.id, user.id, l.REPORT, msg.date)
-        reports = user.get_reports(chat)
+        reports = counts[user.id]
 
         if reports >= chat.report_count:
             restrict.append(user)
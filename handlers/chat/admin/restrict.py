@@ -8,7 +8,7 @@ from libs.user import User
 from locales import other, text, buttons
 from src import filters as f
 from src import utils as u
-from src.instances import MessageData, Database
+from src.instances import MessageData, Database, MessageWriter
 from src.parsers import dates
 
 
@@ -136,6 +136,7 @@ async def process_restrict(parsed: ParsedArgs):
     parsed.targets: list[User]
     chat_id = t.Chat.get_current().id
     type = parsed.command.text
+    restricted = []
 
     for user in parsed.targets:
         try:
@@ -149,12 +150,12 @@ async def process_restrict(parsed: ParsedArgs):
                 await user.mute(chat_id, parsed.until)
             elif type == "unmute":
                 await user.unmute(chat_id)
-
-            if parsed.flags.clear_history and type in ["ban", "mute", "kick"]:
-                messages = [
-                    m.message_id for m in
-                    Database.get_messages(user_id=user.id, chat_id=chat_id, delta=timedelta(days=1))
-                ]
-                await process_purge(messages)
+            restricted.append(user.id)
         except Exception:
             pass
+
+    if restricted and parsed.flags.clear_history and type in ["ban", "mute", "kick"]:
+        # one purge for every target, their rows are deleted in one transaction
+        await MessageWriter.flush()
+        messages = await Database.get_message_ids(chat_id, restricted, timedelta(days=1))
+        await process_purge(messages)
@@ -0,0 +1,76 @@
+import html
+
+from aiogram import types as t
+from aiogram.types import InlineKeyboardMarkup as IM
+
+from libs.command_parser import ParsedArgs
+from locales import other, text, buttons
+from src import filters as f
+from src import utils as u
+from src.instances import Database, MessageData, SearchWriter
+
+PAGE = 10
+SNIPPET = 100
+
+
+def message_link(chat_id: int, message_id: int) -> str:
+    return f"https://t.me/c/{str(chat_id).removeprefix('-100')}/{message_id}"
+
+
+async def search_page(chat_id: int, query: str, page: int) -> tuple[str, IM | None]:
+    results = await Database.search_messages(chat_id, query, PAGE + 1, page * PAGE)
+    if not results and not page:
+        return text.chat.admin.search_empty.format(query=html.escape(query)), None
+
+    txt = text.chat.admin.search.format(query=html.escape(query), page=page + 1)
+    for n, result in enumerate(results[:PAGE], page * PAGE + 1):
+        snippet = result.message if len(result.message) <= SNIPPET else result.message[:SNIPPET] + "…"
+        txt += text.chat.admin.search_sample.format(
+            n=n,
+            link=message_link(result.chat_id, result.message_id),
+            date=result.date.strftime("%d.%m.%Y %H:%M"),
+            text=html.escape(snippet)
+        )
+
+    markup = IM(row_width=2)
+    if page:
+        markup.insert(buttons.chat.admin.search_previous)
+    if len(results) > PAGE:
+        markup.insert(buttons.chat.admin.search_next)
+    return txt, markup
+
+
+@other.parsers.search(
+    f.user.is_admin,
+    f.message.is_chat,
+    u.write_action,
+    u.get_help
+)
+async def search(msg: t.Message, parsed: ParsedArgs):
+    parsed.query: str
+
+    await SearchWriter.flush()
+    txt, markup = await search_page(msg.chat.id, parsed.query, 0)
+    answer = await msg.answer(txt, reply_markup=markup, disable_web_page_preview=True)
+
+    with MessageData.data(answer) as data:
+        data.query = parsed.query
+        data.page = 0
+
+
+@buttons.chat.admin.search_previous(f.message.is_chat, f.user.is_admin)
+@buttons.chat.admin.search_next(f.message.is_chat, f.user.is_admin)
+async def search_turn(clb: t.CallbackQuery):
+    with MessageData.data() as data:
+        query: str = data.query
+        page: int = data.page
+    if query is None:
+        await clb.message.delete_reply_markup()
+        return
+
+    page += -1 if clb.data == "search_previous" else 1
+    txt, markup = await search_page(clb.message.chat.id, query, page)
+    await clb.message.edit_text(txt, reply_markup=markup, disable_web_page_preview=True)
+
+    with MessageData.data() as data:
+        data.page = page
@@ -1,2 +1,54 @@
+from datetime import timedelta
 
+from aiogram import types as t
 
+from libs.command_parser import ParsedArgs
+from libs.user import User
+from locales import other, text
+from src import filters as f
+from src import utils as u
+from src.instances import Analytics, MessageWriter
+
+
+async def user_link(user_id: int) -> str:
+    try:
+        return (await User.create(user_id)).link
+    except Exception:
+        return str(user_id)
+
+
+@other.parsers.stats(f.message.is_chat, u.write_action)
+async def stats(msg: t.Message, parsed: ParsedArgs):
+    """
+    Chat statistic, computed from the cached message columns
+    """
+    parsed.delta: timedelta
+    s = text.chat.statistic
+    delta = min(parsed.delta, Analytics.window)  # only the window is loaded, the header shows what was covered
+
+    await MessageWriter.flush()
+    result = await Analytics.stats(msg.chat.id, delta)
+
+    if not result.messages:
+        await msg.answer(s.empty.format(days=delta.days))
+        return
+
+    answer = s.title.format(
+        days=delta.days,
+        count=result.messages,
+        users=result.users,
+        replies=round(result.reply_ratio * 100),
+        length=round(result.average_length),
+        hour=result.peak_hour
+    )
+
+    answer += str(s.top_users)
+    for user_id, count in result.top_users:
+        answer += s.sample.format(name=await user_link(user_id), count=count)
+
+    answer += str(s.lengths)
+    for bucket, count in enumerate(result.lengths):
+        if bucket and count:
+            answer += s.sample.format(name=f"< {2 ** bucket}", count=count)
+
+    await msg.answer(answer, disable_web_page_preview=True)
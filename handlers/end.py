@@ -17,7 +17,7 @@ async def alias_executor(msg: t.Message):
     """
     upd = t.Update.get_current()
 
-    aliases = get_aliases(msg)
+    aliases = await get_aliases(msg)
     text = get_alias_text(msg)
 
     msg.sticker = None
@@ -3,3 +3,4 @@ from . import settings
 
 from . import alias_form
 from . import report_form
+from . import message_statistic
@@ -40,7 +40,7 @@ async def command_form(msg: t.Message, state: FSMContext):
         target: Chat | User = data.target
 
     settings[key] = value
-    save_target_settings(target)
+    await save_target_settings(target)
 
     await handlers.all.cancel(msg, state)
 
@@ -0,0 +1,60 @@
+from collections import Counter
+from datetime import timedelta
+
+from aiogram import types as t
+
+from libs.chat import Chat
+from libs.command_parser import ParsedArgs
+from libs.database import type_name
+from locales import other, text
+from src import filters as f
+from src import utils as u
+from src.instances import Database, MessageStats
+
+TOP = 5
+LAST_DAYS = 10
+
+
+async def chat_title(chat_id: int) -> str:
+    try:
+        return (await Chat.create(chat_id)).title
+    except Exception:
+        return str(chat_id)
+
+
+@other.parsers.stats(f.message.is_private, u.write_action)
+async def stats(msg: t.Message, parsed: ParsedArgs):
+    """
+    Message statistic of the user, read from the MessageStats rollup
+    """
+    parsed.delta: timedelta
+    s = text.private.statistic
+
+    await MessageStats.flush()
+    rows = await Database.sum_message_stats("chat_id", "day", "type", user_id=msg.from_user.id, delta=parsed.delta)
+
+    chats, days, types = Counter(), Counter(), Counter()
+    for chat_id, day, type, count in rows:
+        chats[chat_id] += count
+        days[day] += count
+        types[type_name(type)] += count
+
+    if not rows:
+        await msg.answer(s.empty.format(days=parsed.delta.days))
+        return
+
+    answer = s.title.format(days=parsed.delta.days, count=sum(chats.values()))
+
+    answer += str(s.by_chat)
+    for chat_id, count in chats.most_common(TOP):
+        answer += s.sample.format(name=await chat_title(chat_id), count=count)
+
+    answer += str(s.by_type)
+    for type, count in types.most_common():
+        answer += s.sample.format(name=type, count=count)
+
+    answer += str(s.by_day)
+    for day in sorted(days, reverse=True)[:LAST_DAYS]:
+        answer += s.sample.format(name=day.strftime("%d.%m.%Y"), count=days[day])
+
+    await msg.answer(answer)
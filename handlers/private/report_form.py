@@ -26,7 +26,7 @@ async def report_command(msg: t.Message, state: FSMContext):
         target: Chat | User = data.target
 
     settings["command"] = f"/{msg.get_command(True)} {msg.get_args()}".strip()
-    save_target_settings(target)
+    await save_target_settings(target)
 
     await handlers.all.cancel(msg, state)
 
@@ -41,7 +41,7 @@ async def report_count(msg: t.Message, state: FSMContext):
 
     parsed = await parsers.report_count.parse_message(msg)
     settings["count"] = parsed.count
-    save_target_settings(target)
+    await save_target_settings(target)
 
     await handlers.all.cancel(msg, state)
 
@@ -56,7 +56,7 @@ async def report_delta(msg: t.Message, state: FSMContext):
 
     parsed = await parsers.report_delta.parse_message(msg)
     settings["delta"] = int(parsed.delta.total_seconds())
-    save_target_settings(target)
+    await save_target_settings(target)
 
     await handlers.all.cancel(msg, state)
 
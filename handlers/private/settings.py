@@ -20,6 +20,7 @@ s = buttons.private.settings
 alias_data = CallbackData("delete_alias", "id")
 lang_data = CallbackData("change_lang", "lang")
 statistic_data = CallbackData("statistic", "mode")
+retention_data = CallbackData("retention", "days")
 set_report_delta = CallbackData("set_report_delta", "delta")
 
 
@@ -101,7 +102,7 @@ async def delete_yes(clb: t.CallbackQuery):
     menu.update(prop.menu(settings))
     await menu.edit(False)
 
-    save_target_settings(target)
+    await save_target_settings(target)
 
 
 @dp.callback_query_handler(f.message.is_private, lang_data.filter())
@@ -111,7 +112,7 @@ async def edit_lang(clb: t.CallbackQuery, callback_data: dict[str, str]):
         target: Chat | User = data.target
 
     settings["lang"] = callback_data["lang"]
-    save_target_settings(target)
+    await save_target_settings(target)
     await handlers.all.back(clb)
 
 
@@ -123,7 +124,7 @@ async def statistic_change(clb: t.CallbackQuery, callback_data: dict[str, str]):
         menu: Submenu = data.menu
 
     settings["mode"] = int(callback_data["mode"])
-    save_target_settings(target)
+    await save_target_settings(target)
 
     await clb.answer(text.private.settings.statistic_mode_changed)
     await menu.edit(False)
@@ -156,3 +157,25 @@ def format_report_delta(txt: str):
     with MessageData.data() as data:
         target: Chat = data.target
     return txt.format(delta=target.report_delta.days)
+
+
+@dp.callback_query_handler(f.message.is_private, retention_data.filter())
+async def retention_change(clb: t.CallbackQuery, callback_data: dict[str, str]):
+    with MessageData.data() as data:
+        settings: SettingsType = data.settings
+        target: Chat | User = data.target
+        menu: Submenu = data.menu
+
+    settings["days"] = int(callback_data["days"])
+    await save_target_settings(target)
+
+    await clb.answer(text.private.settings.retention_changed)
+    await menu.edit(False)
+
+
+@buttons.retention_title.format_callback()
+@text.private.settings.retention_changed.format_callback()
+def format_retention(txt: str):
+    with MessageData.data() as data:
+        target: Chat = data.target
+    return txt.format(days=target.retention_days)
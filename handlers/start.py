@@ -1,12 +1,18 @@
 from __future__ import annotations
 
+import html
+
 from aiogram import types as t
 
 from bot import dp
 from libs.command_parser import ParsedArgs
 from libs.errors import MyError, ERRORS, IGNORE, ForceError
 from locales import other
-from src.instances import Cache
+from src import filters as f
+from src.instances import Cache, Database, MessageStats, MessageWriter, SearchWriter
+
+QUERIES_TOP = 15
+QUERY_SHAPE = 200
 
 
 @dp.errors_handler()
@@ -30,3 +36,47 @@ async def errors(_, error: MyError | Exception):
 async def test_xd(msg: t.Message, parsed: ParsedArgs):
     Cache.expire()
     await msg.answer("All cache expired")
+
+
+@other.parsers.cache(f.user.is_operator)
+async def cache(msg: t.Message, parsed: ParsedArgs):
+    """
+    Counters of every cache group, -r resets them
+    """
+    answer = "Cache groups"
+    for name, s in Cache.stats().items():
+        answer += (
+            f"\n\n<code>{html.escape(name)}</code>\n"
+            f"{s.size} entries, {s.bytes} bytes, {s.loading} loading\n"
+            f"{s.hits} hits, {s.misses} misses ({s.hit_ratio * 100:.1f}% hit)\n"
+            f"{s.expirations} expired, {s.evictions} evicted\n"
+            f"{s.refreshes} refreshed, {s.refresh_failures} refresh failures"
+        )
+    if parsed.flags.reset:
+        Cache.reset_stats()
+    await msg.answer(answer)
+
+
+@other.parsers.queries(f.user.is_operator)
+async def queries(msg: t.Message, parsed: ParsedArgs):
+    """
+    Query timings per Database method, or per statement shape with -s, then the batch writers
+    """
+    stats = Database.metrics.snapshot("shape" if parsed.flags.shape else "caller")
+    if parsed.flags.reset:
+        Database.metrics.reset()
+
+    answer = "Queries, ms: p50 / p95 / p99 / max"
+    for s in stats[:QUERIES_TOP]:
+        answer += (
+            f"\n\n<code>{html.escape(s.name[:QUERY_SHAPE])}</code>\n"
+            f"{s.count} × {s.p50 * 1000:.1f} / {s.p95 * 1000:.1f} / {s.p99 * 1000:.1f} / {s.max * 1000:.1f}, "
+            f"{s.rows} rows, {s.total:.2f} s total"
+        )
+        if s.errors:
+            answer += f", {s.errors} errors"
+
+    answer += "\n\nWriters"
+    for writer in (MessageWriter, SearchWriter, MessageStats):
+        answer += f"\n<code>{writer.table}</code>: {writer.summary()}"
+    await msg.answer(answer)
@@ -1,3 +1,6 @@
+from . import analytics
+from . import archive
+from . import batch
 from . import buttons
 from . import cache
 from . import command_parser
@@ -8,3 +11,6 @@ from . import message
 from . import stages
 from . import errors
 from . import locales
+from . import metrics
+from . import migrations
+from . import retention
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import time
+import typing as p
+from array import array
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+
+if p.TYPE_CHECKING:
+    from libs.database import Database
+
+LENGTH_BUCKETS = 16  # text length by bit length: 0 - no text, n - below 2 ** n
+
+
+class Aggregate:
+    """
+    Mergeable sums over a range of rows
+    """
+    __slots__ = ("users", "hours", "buckets", "replies", "length")
+
+    users: Counter
+    hours: Counter
+    buckets: Counter
+    replies: int
+    length: int
+
+    def __init__(self):
+        self.users = Counter()
+        self.hours = Counter()
+        self.buckets = Counter()
+        self.replies = 0
+        self.length = 0
+
+    @classmethod
+    def scan(cls, columns: "ChatColumns", lo: int, hi: int) -> "Aggregate":
+        """
+        Zero-copy slices, every pass is a C level count or sum
+        """
+        result = cls()
+        result.users = Counter(memoryview(columns.user_id)[lo:hi])
+        result.hours = Counter(bytes(memoryview(columns.hour)[lo:hi]))
+        result.buckets = Counter(bytes(memoryview(columns.bucket)[lo:hi]))
+        result.replies = bytes(memoryview(columns.reply)[lo:hi]).count(1)
+        result.length = sum(memoryview(columns.length)[lo:hi])
+        return result
+
+    def __iadd__(self, other: "Aggregate") -> "Aggregate":
+        self.users.update(other.users)
+        self.hours.update(other.hours)
+        self.buckets.update(other.buckets)
+        self.replies += other.replies
+        self.length += other.length
+        return self
+
+
+class ChatColumns:
+    """
+    Messages of one chat as parallel arrays, oldest first.
+    Rows are only appended, so aggregates of full `BLOCK` row blocks are computed once and kept
+    """
+    __slots__ = ("chat_id", "last_message_id", "loaded", "date", "user_id", "hour", "reply", "length", "bucket",
+                 "_blocks")
+
+    BLOCK = 16384
+
+    chat_id: int
+    last_message_id: int
+    loaded: float
+
+    date: array  # unix time
+    user_id: array
+    hour: array  # hour of the week, monday 00:00 is 0
+    reply: array
+    length: array
+    bucket: array
+
+    _blocks: dict[int, Aggregate]
+
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self.last_message_id = 0
+        self.loaded = time.monotonic()
+
+        self.date = array("q")
+        self.user_id = array("q")
+        self.hour = array("B")
+        self.reply = array("B")
+        self.length = array("I")
+        self.bucket = array("B")
+
+        self._blocks = {}
+
+    def __len__(self) -> int:
+        return len(self.date)
+
+    def append(self, message_id: int, user_id: int, date: datetime, reply: bool, text: str | None):
+        if message_id <= self.last_message_id:  # already loaded or dispatched again
+            return
+        self.last_message_id = message_id
+        self.write(user_id, date, reply, text)
+
+    def write(self, user_id: int, date: datetime, reply: bool, text: str | None):
+        """
+        One row at the end, without the order check `append` does
+        """
+        length = len(text) if text else 0
+        self.date.append(int(date.timestamp()))
+        self.user_id.append(user_id)
+        self.hour.append(date.weekday() * 24 + date.hour)
+        self.reply.append(1 if reply else 0)
+        self.length.append(length)
+        self.bucket.append(min(length.bit_length(), LENGTH_BUCKETS - 1))
+
+    def reverse(self):
+        """
+        Rows written newest first are turned oldest first in place
+        """
+        for column in (self.date, self.user_id, self.hour, self.reply, self.length, self.bucket):
+            column.reverse()
+
+    def start(self, since: datetime | None) -> int:
+        if since is None:
+            return 0
+        return bisect.bisect_left(self.date, int(since.timestamp()))
+
+    def block(self, n: int) -> Aggregate:
+        if n not in self._blocks:
+            self._blocks[n] = Aggregate.scan(self, n * self.BLOCK, (n + 1) * self.BLOCK)
+        return self._blocks[n]
+
+    def aggregate(self, lo: int, hi: int) -> Aggregate:
+        first = -(-lo // self.BLOCK)
+        last = hi // self.BLOCK
+        if first >= last:
+            return Aggregate.scan(self, lo, hi)
+
+        result = Aggregate.scan(self, lo, first * self.BLOCK)
+        for n in range(first, last):
+            result += self.block(n)
+        result += Aggregate.scan(self, last * self.BLOCK, hi)
+        return result
+
+
+class ChatStats(p.NamedTuple):
+    messages: int
+    users: int
+    top_users: list[tuple[int, int]]
+    heatmap: list[int]  # 168 hours of the week
+    hours: list[int]
+    replies: int
+    lengths: list[int]  # LENGTH_BUCKETS counts
+    average_length: float
+
+    @property
+    def reply_ratio(self) -> float:
+        return self.replies / self.messages if self.messages else 0.0
+
+    @property
+    def peak_hour(self) -> int:
+        return max(range(24), key=self.hours.__getitem__)
+
+
+def compute(columns: ChatColumns, since: datetime | None = None, top: int = 5) -> ChatStats:
+    start = columns.start(since)
+    result = columns.aggregate(start, len(columns))
+
+    messages = len(columns) - start
+    heatmap = [result.hours[h] for h in range(168)]
+    lengths = [result.buckets[b] for b in range(LENGTH_BUCKETS)]
+    texts = messages - lengths[0]
+
+    return ChatStats(
+        messages=messages,
+        users=len(result.users),
+        top_users=result.users.most_common(top),
+        heatmap=heatmap,
+        hours=[sum(heatmap[h::24]) for h in range(24)],
+        replies=result.replies,
+        lengths=lengths,
+        average_length=result.length / texts if texts else 0.0,
+    )
+
+
+class Analytics:
+    """
+    Chat message columns cached per chat, loaded once from Messages and appended to on ingestion
+    """
+    _chats: OrderedDict[int, ChatColumns]
+    _loading: dict[int, asyncio.Task]
+    _pending: dict[int, list[tuple]]
+
+    database: "Database"
+    window: timedelta
+    expires: timedelta
+    max_chats: int
+    page: int
+
+    def __init__(self,
+                 database: "Database",
+                 window: timedelta = timedelta(days=30),
+                 expires: timedelta = timedelta(hours=1),
+                 max_chats: int = 32,
+                 page: int = 5000):
+        self._chats = OrderedDict()
+        self._loading = {}
+        self._pending = {}
+
+        self.database = database
+        self.window = window
+        self.expires = expires
+        self.max_chats = max_chats
+        self.page = page
+
+    def append(self,
+               chat_id: int,
+               message_id: int,
+               user_id: int,
+               date: datetime,
+               reply: bool = False,
+               text: str | None = None):
+        """
+        Only chats in memory or being loaded are appended to, others are loaded when asked for
+        """
+        columns = self._chats.get(chat_id)
+        if columns is not None:
+            columns.append(message_id, user_id, date, reply, text)
+        pending = self._pending.get(chat_id)
+        if pending is not None:  # replayed once the load is done, rows it already has are skipped
+            pending.append((message_id, user_id, date, reply, text))
+
+    def drop(self, chat_id: int):
+        self._chats.pop(chat_id, None)
+
+    async def columns(self, chat_id: int) -> ChatColumns:
+        columns = self._chats.get(chat_id)
+        if columns is not None and time.monotonic() - columns.loaded < self.expires.total_seconds():
+            self._chats.move_to_end(chat_id)
+            return columns
+
+        if chat_id not in self._loading:  # concurrent callers share one load
+            self._loading[chat_id] = asyncio.create_task(self._load(chat_id))
+        try:
+            return await asyncio.shield(self._loading[chat_id])
+        finally:
+            self._loading.pop(chat_id, None)
+
+    async def stats(self, chat_id: int, delta: timedelta | None = None, top: int = 5) -> ChatStats:
+        columns = await self.columns(chat_id)
+        return compute(columns, datetime.now() - delta if delta else None, top)
+
+    async def _load(self, chat_id: int) -> ChatColumns:
+        """
+        Pages come newest first, they are written as they arrive and the columns are reversed once at the end
+        """
+        columns = ChatColumns(chat_id)
+        oldest = None
+        self._pending[chat_id] = []
+        try:
+            async for m in self.database.iter_messages(chat_id=chat_id, delta=self.window, size=self.page):
+                if oldest is not None and m.message_id >= oldest:  # already written
+                    continue
+                if oldest is None:
+                    columns.last_message_id = m.message_id
+                oldest = m.message_id
+                columns.write(m.user_id, m.date, m.reply_message_id is not None, m.message)
+        finally:
+            pending = self._pending.pop(chat_id)
+
+        columns.reverse()
+        for row in pending:
+            columns.append(*row)
+        for n in range(len(columns) // columns.BLOCK):
+            columns.block(n)
+
+        self._chats[chat_id] = columns
+        self._chats.move_to_end(chat_id)
+        while len(self._chats) > self.max_chats:
+            self._chats.popitem(last=False)
+        return columns
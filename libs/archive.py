@@ -0,0 +1,385 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import typing as p
+import zlib
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from libs.database import IN_TYPES, Query, messageOBJ, type_code
+
+if p.TYPE_CHECKING:
+    from libs.database import Database
+
+MAGIC = b"TKSEG\x01\r\n"
+SUFFIX = ".seg"
+NO_TEXT = 0xFFFFFFFF
+
+# message_id, user_id, reply_message_id (0 - none), type, date (unix time), text length (NO_TEXT - none)
+ROW = struct.Struct("<qqqBqI")
+# first and last message_id, first and last date, offset and size of the compressed block, rows
+INDEX = struct.Struct("<qqqqQII")
+# index offset, blocks
+FOOTER = struct.Struct("<QI8s")
+
+
+def segment_bound(path: Path) -> date:
+    """
+    Segments are named after the partition they were archived from, `pYYYYMMDD` is the first day they do not hold
+    """
+    return datetime.strptime(path.stem, "p%Y%m%d").date()
+
+
+def pack_block(rows: p.Sequence[messageOBJ]) -> bytes:
+    data = bytearray()
+    for row in rows:
+        text = row.message.encode() if row.message is not None else b""
+        data += ROW.pack(
+            row.message_id,
+            row.user_id,
+            row.reply_message_id or 0,
+            type_code(row[5]),
+            int(row.date.timestamp()),
+            len(text) if row.message is not None else NO_TEXT
+        )
+        data += text
+    return zlib.compress(data)
+
+
+def unpack_block(chat_id: int, data: bytes) -> list[messageOBJ]:
+    rows = []
+    pos = 0
+    while pos < len(data):
+        message_id, user_id, reply_message_id, type, timestamp, length = ROW.unpack_from(data, pos)
+        pos += ROW.size
+        if length == NO_TEXT:
+            text = None
+        else:
+            text = data[pos:pos + length].decode()
+            pos += length
+        rows.append(messageOBJ(
+            user_id,
+            chat_id,
+            message_id,
+            reply_message_id or None,
+            text,
+            type,
+            datetime.fromtimestamp(timestamp)
+        ))
+    return rows
+
+
+def write_segment(path: Path, rows: list[messageOBJ], block: int = 512):
+    """
+    Rows sorted by message_id in zlib blocks of `block` rows, then the block index and the footer.
+    Written aside and renamed, so a segment is either complete or absent
+    """
+    rows = sorted(rows, key=lambda r: r.message_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(".tmp", path.stem, path.parent)  # concurrent writers never share the file
+
+    try:
+        with open(fd, "wb") as file:
+            file.write(MAGIC)
+            index = bytearray()
+            for n in range(0, len(rows), block):
+                chunk = rows[n:n + block]
+                data = pack_block(chunk)
+                index += INDEX.pack(
+                    chunk[0].message_id,
+                    chunk[-1].message_id,
+                    int(min(r.date for r in chunk).timestamp()),
+                    int(max(r.date for r in chunk).timestamp()),
+                    file.tell(),
+                    len(data),
+                    len(chunk)
+                )
+                file.write(data)
+
+            offset = file.tell()
+            file.write(index)
+            file.write(FOOTER.pack(offset, len(index) // INDEX.size, MAGIC))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def matcher(user_id: int | p.Collection[int] | None = None,
+            message_id: int | p.Collection[int] | None = None,
+            reply_message_id: int | None = None,
+            message: str | None = None,
+            type: str | int | None = None,
+            since: datetime | None = None) -> p.Callable[[messageOBJ], bool]:
+    """
+    Row filter for the Messages selectors, collections match any of their values
+    """
+    user_ids = set(user_id) if isinstance(user_id, IN_TYPES) else {user_id}
+    message_ids = set(message_id) if isinstance(message_id, IN_TYPES) else {message_id}
+    type = type_code(type)
+
+    def match(row: messageOBJ) -> bool:
+        return (
+            (user_id is None or row.user_id in user_ids)
+            and (message_id is None or row.message_id in message_ids)
+            and (reply_message_id is None or row.reply_message_id == reply_message_id)
+            and (message is None or row.message == message)
+            and (type is None or row[5] == type)
+            and (since is None or row.date >= since)
+        )
+
+    return match
+
+
+class Segment:
+    """
+    Memory-mapped segment reader, only the index is parsed on open and blocks are inflated when read
+    """
+    __slots__ = ("chat_id", "path", "index", "_file", "_map")
+
+    chat_id: int
+    path: Path
+    index: list[tuple[int, int, int, int, int, int, int]]
+
+    def __init__(self, chat_id: int, path: Path):
+        self.chat_id = chat_id
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+
+        offset, blocks, magic = FOOTER.unpack_from(self._map, len(self._map) - FOOTER.size)
+        if magic != MAGIC or self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a message segment")
+        self.index = [INDEX.unpack_from(self._map, offset + n * INDEX.size) for n in range(blocks)]
+
+    def __len__(self) -> int:
+        return sum(i[6] for i in self.index)
+
+    def __enter__(self) -> "Segment":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def block(self, n: int) -> list[messageOBJ]:
+        offset, size = self.index[n][4:6]
+        return unpack_block(self.chat_id, zlib.decompress(self._map[offset:offset + size]))
+
+    def blocks(self, message_ids: p.Sequence[int] | None = None, since: datetime | None = None) -> list[int]:
+        """
+        Blocks whose index can hold one of the sorted `message_ids` and rows from `since` on
+        """
+        since = int(since.timestamp()) if since is not None else None
+        result = []
+        for n, (first, last, oldest, newest) in enumerate(i[:4] for i in self.index):
+            if since is not None and newest < since:
+                continue
+            if message_ids is not None:
+                k = bisect.bisect_left(message_ids, first)
+                if k == len(message_ids) or message_ids[k] > last:
+                    continue
+            result.append(n)
+        return result
+
+    def rows(self,
+             before: int | None = None,
+             since: datetime | None = None) -> p.Iterator[messageOBJ]:
+        """
+        Newest first, blocks entirely at or above `before` or older than `since` are not inflated
+        """
+        since = int(since.timestamp()) if since is not None else None
+        for n in reversed(range(len(self.index))):
+            first, last, oldest, newest = self.index[n][:4]
+            if before is not None and first >= before:
+                continue
+            if since is not None and newest < since:
+                continue
+            for row in reversed(self.block(n)):
+                if before is not None and row.message_id >= before:
+                    continue
+                if since is not None and row.date.timestamp() < since:
+                    continue
+                yield row
+
+
+class Archive:
+    """
+    Cold Messages days as per-chat segment files, `<path>/<chat_id>/<partition>.seg`.
+    A partition is archived right before it is dropped, deletes rewrite the segments they touch one chat at a time
+    """
+    path: Path
+    after: timedelta
+    block: int
+    page: int
+
+    _locks: dict[int, asyncio.Lock]
+
+    def __init__(self,
+                 path: str | Path = "data/archive",
+                 after: timedelta = timedelta(days=3),
+                 block: int = 512,
+                 page: int = 10000):
+        self.path = Path(path)
+        self.after = after
+        self.block = block
+        self.page = page
+
+        self._locks = {}
+
+    def lock(self, chat_id: int) -> asyncio.Lock:
+        """
+        Held around every write to the chat's segments
+        """
+        return self._locks.setdefault(chat_id, asyncio.Lock())
+
+    def chats(self) -> list[int]:
+        if not self.path.is_dir():
+            return []
+        return sorted((int(d.name) for d in self.path.iterdir() if d.is_dir()), reverse=True)
+
+    def segments(self, chat_id: int) -> list[Path]:
+        """
+        Oldest first, names sort by date
+        """
+        directory = self.path / str(chat_id)
+        if not directory.is_dir():
+            return []
+        return sorted(directory.glob(f"*{SUFFIX}"))
+
+    async def archive(self, database: "Database", partition: str) -> int:
+        """
+        Copy one Messages partition into segments, chat by chat
+        """
+        archived = 0
+        chat_id, rows = None, []
+        last = (-(1 << 63), 0)
+
+        while True:
+            page = await database.get(Query(
+                f"SELECT * FROM Messages PARTITION ({partition}) WHERE (chat_id,message_id)>(%s,%s) "
+                f"ORDER BY chat_id,message_id LIMIT %s",
+                (*last, self.page)
+            ), unbuffered=True)
+
+            for row in map(messageOBJ._make, page):
+                if row.chat_id != chat_id and rows:
+                    archived += await self._write(chat_id, partition, rows)
+                    rows = []
+                chat_id = row.chat_id
+                rows.append(row)
+
+            if len(page) < self.page:
+                break
+            last = (page[-1][1], page[-1][2])
+
+        if rows:
+            archived += await self._write(chat_id, partition, rows)
+        return archived
+
+    async def _write(self, chat_id: int, partition: str, rows: list[messageOBJ]) -> int:
+        path = self.path / str(chat_id) / f"{partition}{SUFFIX}"
+        async with self.lock(chat_id):
+            await asyncio.to_thread(write_segment, path, rows, self.block)
+        return len(rows)
+
+    def expire(self, today: date, windows: dict[int, int], default: int) -> int:
+        """
+        Remove segments that only hold days older than the chat's window
+        """
+        removed = 0
+        for chat_id in self.chats():
+            horizon = today - timedelta(days=windows.get(chat_id, default))
+            for path in self.segments(chat_id):
+                if segment_bound(path) <= horizon:
+                    path.unlink(missing_ok=True)
+                    removed += 1
+        return removed
+
+    async def delete_chat(self, chat_id: int):
+        async with self.lock(chat_id):
+            await asyncio.to_thread(shutil.rmtree, self.path / str(chat_id), ignore_errors=True)
+
+    async def delete(self,
+                     chat_id: int | None = None,
+                     delta: timedelta | None = None,
+                     **selectors) -> int:
+        """
+        Rewrite the segments holding matching rows without them, a segment left empty is removed
+        """
+        since = datetime.now() - delta if delta else None
+        match = matcher(since=since, **selectors)
+        message_id = selectors.get("message_id")
+        if message_id is None:
+            message_ids = None
+        else:
+            message_ids = sorted(message_id) if isinstance(message_id, IN_TYPES) else [message_id]
+
+        def rewrite(c_id: int, path: Path) -> int:
+            with Segment(c_id, path) as segment:
+                # only blocks the index can not rule out are inflated to look for matches
+                found = {}
+                for n in segment.blocks(message_ids, since):
+                    block = segment.block(n)
+                    if any(map(match, block)):
+                        found[n] = block
+                if not found:
+                    return 0
+                rows = [row for n in range(len(segment.index)) for row in found.get(n) or segment.block(n)]
+
+            kept = [row for row in rows if not match(row)]
+            if kept:
+                write_segment(path, kept, self.block)
+            else:
+                path.unlink(missing_ok=True)
+            return len(rows) - len(kept)
+
+        deleted = 0
+        for c_id in self.chats() if chat_id is None else [chat_id]:
+            async with self.lock(c_id):
+                for path in reversed(self.segments(c_id)):
+                    if since is not None and segment_bound(path) <= since.date():
+                        break
+                    deleted += await asyncio.to_thread(rewrite, c_id, path)
+        return deleted
+
+    async def iter_messages(self,
+                            chat_id: int | None = None,
+                            before: int | None = None,
+                            user_id: int | p.Collection[int] | None = None,
+                            reply_message_id: int | None = None,
+                            message: str | None = None,
+                            type: str | int | None = None,
+                            delta: timedelta | None = None) -> p.AsyncIterator[messageOBJ]:
+        """
+        Newest first like `Database.iter_messages`, one segment is read at a time off the event loop
+        """
+        since = datetime.now() - delta if delta else None
+        match = matcher(user_id, reply_message_id=reply_message_id, message=message, type=type)
+
+        def select(c_id: int, path: Path) -> list[messageOBJ]:
+            with Segment(c_id, path) as segment:
+                return [row for row in segment.rows(before if c_id == chat_id else None, since) if match(row)]
+
+        for c_id in self.chats() if chat_id is None else [chat_id]:
+            for path in reversed(self.segments(c_id)):
+                if since is not None and segment_bound(path) <= since.date():
+                    break
+                for row in await asyncio.to_thread(select, c_id, path):
+                    yield row
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import typing as p
+from datetime import timedelta
+
+from libs.database import compile_insert, to_param
+
+if p.TYPE_CHECKING:
+    from libs.database import Database
+
+
+class BatchWriter:
+    """
+    Write-behind buffer, rows are inserted with one multi-row INSERT per `size` rows or `delay`
+    """
+    _rows: list[tuple]
+    _timer: asyncio.Task | None
+    _full: asyncio.Event
+    _lock: asyncio.Lock
+
+    database: "Database"
+    table: str
+    columns: tuple[str, ...]
+    size: int
+    delay: timedelta
+    limit: int
+    prepare: p.Callable[[dict], dict] | None
+
+    flushes: int
+    flushed: int
+    failures: int
+    dropped: int
+    last_latency: float
+    max_latency: float
+    total_latency: float
+
+    def __init__(self,
+                 database: "Database",
+                 table: str,
+                 columns: p.Iterable[str],
+                 size: int = 100,
+                 delay: timedelta = timedelta(milliseconds=500),
+                 limit: int = 10000,
+                 prepare: p.Callable[[dict], dict] | None = None):
+        self._rows = []
+        self._timer = None
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+        self.database = database
+        self.table = table
+        self.columns = tuple(columns)
+        self.size = size
+        self.delay = delay
+        self.limit = limit
+        self.prepare = prepare
+
+        self.flushes = 0
+        self.flushed = 0
+        self.failures = 0
+        self.dropped = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    @property
+    def sql(self) -> str:
+        # a duplicate or orphan row must not fail the whole batch
+        return compile_insert(self.table, self.columns, ignore=True)
+
+    @property
+    def depth(self) -> int:
+        return len(self._rows)
+
+    async def add(self, **values: p.Any):
+        if self.depth >= self.limit:  # backpressure, the producer waits for the flush
+            await self.flush()
+
+        if self.prepare:
+            values = self.prepare(values)
+        self._rows.append(tuple(to_param(values.get(c)) for c in self.columns))
+        self._schedule()
+
+    def _schedule(self):
+        if self.depth >= self.size:
+            self._full.set()
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    def _take(self) -> list[tuple]:
+        rows, self._rows = self._rows, []
+        return rows
+
+    def _restore(self, rows: list[tuple]):
+        """
+        Rows of a failed flush go back in front, the oldest are dropped past `limit`
+        """
+        self._rows = rows + self._rows
+        overflow = len(self._rows) - self.limit
+        if overflow > 0:
+            del self._rows[:overflow]
+            self.dropped += overflow
+
+    async def _flush_later(self):
+        try:
+            await asyncio.wait_for(self._full.wait(), self.delay.total_seconds())
+        except asyncio.TimeoutError:
+            pass
+
+        self._full.clear()
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            rows = self._take()
+            if not rows:
+                return
+
+            start = time.perf_counter()
+            try:
+                await self.database.update_many(self.sql, rows)
+            except Exception as ex:
+                dropped = self.dropped
+                self.failures += 1
+                self._restore(rows)
+                logging.error(f"Batch insert into {self.table} failed ({ex.__class__.__name__}:{ex}), "
+                              f"{len(rows)} rows queued again, {self.dropped - dropped} dropped")
+                if self._timer is None:  # retried after `delay`, not at once
+                    self._timer = asyncio.create_task(self._flush_later())
+                return
+
+            latency = time.perf_counter() - start
+            self.flushes += 1
+            self.flushed += len(rows)
+            self.last_latency = latency
+            self.max_latency = max(self.max_latency, latency)
+            self.total_latency += latency
+
+    async def close(self):
+        if self._timer is not None:
+            self._full.set()
+            await self._timer
+        await self.flush()
+
+        if self._timer is not None:  # the last flush failed, there is no retry after close
+            self._timer.cancel()
+            self._timer = None
+        self.dropped += len(self._take())
+        logging.warning(f"{self.table} writer closed: {self.summary()}")
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "depth": self.depth,
+            "flushes": self.flushes,
+            "flushed": self.flushed,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "last_latency": self.last_latency,
+            "max_latency": self.max_latency,
+            "avg_latency": self.total_latency / self.flushes if self.flushes else 0.0,
+        }
+
+    def summary(self) -> str:
+        s = self.stats()
+        return (
+            f"{s['depth']} queued, {s['flushed']} rows in {s['flushes']} flushes, "
+            f"{s['failures']} failed, {s['dropped']} rows dropped, "
+            f"flush ms: {s['avg_latency'] * 1000:.1f} avg / {s['max_latency'] * 1000:.1f} max"
+        )
+
+
+class RollupWriter(BatchWriter):
+    """
+    Counters summed in memory per `keys` and added to `column` with one upsert per flush
+    """
+    _counts: dict[tuple, int]
+    _seen: set[tuple]
+
+    keys: tuple[str, ...]
+    column: str
+    unique: tuple[str, ...]
+
+    def __init__(self,
+                 database: "Database",
+                 table: str,
+                 keys: p.Iterable[str],
+                 column: str = "count",
+                 unique: p.Iterable[str] = (),
+                 size: int = 100,
+                 delay: timedelta = timedelta(seconds=5),
+                 limit: int = 10000,
+                 prepare: p.Callable[[dict], dict] | None = None):
+        self.keys = tuple(keys)
+        self.column = column
+        self.unique = tuple(unique)
+        self._counts = {}
+        self._seen = set()
+
+        super().__init__(database, table, (*self.keys, column), size, delay, limit, prepare)
+
+    @property
+    def sql(self) -> str:
+        column = self.column
+        return f"{compile_insert(self.table, self.columns)} " \
+               f"ON DUPLICATE KEY UPDATE {column}={column}+VALUES({column})"
+
+    @property
+    def depth(self) -> int:
+        return len(self._counts)
+
+    async def add(self, **values: p.Any):
+        if self.depth >= self.limit:
+            await self.flush()
+
+        if self.prepare:
+            values = self.prepare(values)
+
+        if self.unique:  # the same row seen twice, e.g. an update dispatched again, is counted once
+            unique = tuple(values.get(c) for c in self.unique)
+            if unique in self._seen:
+                return
+            self._seen.add(unique)
+
+        key = tuple(to_param(values.get(c)) for c in self.keys)
+        self._counts[key] = self._counts.get(key, 0) + values.get(self.column, 1)
+        self._schedule()
+
+    def _take(self) -> list[tuple]:
+        counts, self._counts = self._counts, {}
+        self._seen.clear()
+        return [(*key, count) for key, count in counts.items()]
+
+    def _restore(self, rows: list[tuple]):
+        for *key, count in rows:
+            key = tuple(key)
+            if key in self._counts or len(self._counts) < self.limit:
+                self._counts[key] = self._counts.get(key, 0) + count
+            else:
+                self.dropped += 1
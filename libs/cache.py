@@ -2,20 +2,26 @@ from __future__ import annotations
 
 import asyncio
 import functools
+import logging
+import sys
+import time
 import typing as p
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from datetime import timedelta
+
+
+Key = p.Hashable
+KeyFunc = p.Callable[..., Key | None]
 
 
 def register_class(obj: p.Type, group: "CacheGroup"):
     @functools.wraps(obj.__new__)
     def new(cls: p.Type, *args, **kwargs):
-        key = key_gen(args, kwargs)
-        if key is None:
-            return
-        result = group.get(key)
+        key = group.make_key(args, kwargs)
+        result = group.get(key) if key is not None else None
         if result is None:
             cls.__init__(cls, *args, **kwargs)
-            result = group.add(cls, key)
+            result = group.add(cls, key) if key is not None else cls
         return result
 
     obj.__new__ = new
@@ -26,19 +32,21 @@ def register_callable(call: p.Callable, group: "CacheGroup"):
     if asyncio.iscoroutinefunction(call):
         @functools.wraps(call)
         async def new(*args, **kwargs):
-            key = key_gen(args, kwargs)
+            key = group.make_key(args, kwargs)
             if key is None:
-                return
+                return await call(*args, **kwargs)
             result = group.get(key)
             if result is None:
-                result = group.add(await call(*args, **kwargs), key)
+                result = await group.load(key, functools.partial(call, *args, **kwargs))
+            elif group.stale(key):
+                group.refresh(key, functools.partial(call, *args, **kwargs))
             return result
     else:
         @functools.wraps(call)
         def new(*args, **kwargs):
-            key = key_gen(args, kwargs)
+            key = group.make_key(args, kwargs)
             if key is None:
-                return
+                return call(*args, **kwargs)
             result = group.get(key)
             if result is None:
                 result = group.add(call(*args, **kwargs), key)
@@ -47,23 +55,87 @@ def register_callable(call: p.Callable, group: "CacheGroup"):
     return new
 
 
-def key_gen(args, kwargs) -> int:
-    return hash(args) + hash(tuple(kwargs.values()))
+_UNHASHABLE = object()
+
+
+def freeze(value: p.Any) -> p.Any:
+    """
+    Hashable equivalent of a call argument, `_UNHASHABLE` if there is none.
+    Containers keep their type, so `[1, 2]` and `(1, 2)` are different keys
+    """
+    if isinstance(value, (list, tuple)):
+        items = tuple(map(freeze, value))
+        return _UNHASHABLE if _UNHASHABLE in items else (type(value), items)
+    if isinstance(value, dict):
+        items = tuple((k, freeze(v)) for k, v in value.items())
+        return _UNHASHABLE if any(v is _UNHASHABLE for _, v in items) else (type(value), frozenset(items))
+    if isinstance(value, (set, frozenset)):
+        return type(value), frozenset(map(freeze, value))
+    try:
+        hash(value)
+    except TypeError:
+        return _UNHASHABLE
+    return value
+
+
+def key_gen(args: tuple, kwargs: dict) -> Key | None:
+    """
+    Arguments as a tuple compared by equality, keyword names included.
+    None when an argument can not be hashed, the call is then not cached
+    """
+    key = freeze((args, tuple(sorted(kwargs.items()))))
+    return None if key is _UNHASHABLE else key
+
+
+def approximate_size(obj: p.Any) -> int:
+    """
+    Shallow size of the object and its attributes, enough to keep a byte budget roughly
+    """
+    size = sys.getsizeof(obj)
+    attributes = getattr(obj, "__dict__", None)
+    if attributes is not None:
+        size += sys.getsizeof(attributes) + sum(map(sys.getsizeof, attributes.values()))
+    return size
+
+
+Scope = p.Callable[[], p.AsyncContextManager]
 
 
 class Cache:
     _cache: dict[str, "CacheGroup"]
+    _task: asyncio.Task | None
+
+    interval: timedelta
+    scope: Scope | None
 
-    def __init__(self):
+    def __init__(self, interval: timedelta = timedelta(minutes=1), scope: Scope | None = None):
+        """
+        `scope` wraps loads that run as tasks, they do not belong to the caller that started them
+        """
         self._cache = {}
+        self._task = None
+
+        self.interval = interval
+        self.scope = scope
 
     def register(self,
                  expires_delta: timedelta | None = None,
                  expires_count: int | None = None,
-                 group_name: str = None):
+                 group_name: str = None,
+                 max_size: int | None = None,
+                 max_bytes: int | None = None,
+                 key: KeyFunc | None = None,
+                 result_key: p.Callable[[p.Any], Key] | None = None,
+                 refresh_delta: timedelta | None = None):
+        """
+        `key` maps the call arguments to the cache key, `result_key` files results under a key of their own,
+        so calls that name the same object differently share one entry.
+        Async results older than `refresh_delta` are still returned and refreshed in the background,
+        only `expires_delta` makes a call wait
+        """
         def wrapper(obj: p.Type | p.Callable):
-            name = group_name or obj.__name__
-            group = self.add(name, expires_delta, expires_count)
+            name = group_name or obj.__qualname__
+            group = self.add(name, expires_delta, expires_count, max_size, max_bytes, key, result_key, refresh_delta)
 
             if isinstance(obj, p.Type):
                 return register_class(obj, group)
@@ -75,8 +147,14 @@ class Cache:
     def add(self,
             group_name: str,
             expires_delta: timedelta | None = None,
-            expires_count: int | None = None) -> "CacheGroup":
-        group = CacheGroup(expires_delta, expires_count)
+            expires_count: int | None = None,
+            max_size: int | None = None,
+            max_bytes: int | None = None,
+            key: KeyFunc | None = None,
+            result_key: p.Callable[[p.Any], Key] | None = None,
+            refresh_delta: timedelta | None = None) -> "CacheGroup":
+        group = CacheGroup(expires_delta, expires_count, max_size, max_bytes, key, result_key, refresh_delta)
+        group.scope = self.scope
         self._cache[group_name] = group
         return group
 
@@ -85,83 +163,320 @@ class Cache:
             return self._cache[group_name]
         return
 
-    def expire(self, group_name: str | None = None, hash: int | None = None):
+    def expire(self, group_name: str | None = None, key: Key | None = None):
         if group_name:
-            self._cache[group_name].expire(hash)
+            self._cache[group_name].expire(key)
         else:
             for group in self._cache.values():
                 group.expire()
 
+    def sweep(self) -> int:
+        return sum(group.sweep() for group in self._cache.values())
+
+    def stats(self) -> dict[str, "CacheStats"]:
+        return {name: group.stats() for name, group in self._cache.items()}
+
+    def reset_stats(self):
+        for group in self._cache.values():
+            group.reset_stats()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval.total_seconds())
+            try:
+                self.sweep()
+            except Exception as ex:
+                logging.error(f"Cache sweep failed ({ex.__class__.__name__}:{ex})")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class CacheStats(p.NamedTuple):
+    size: int
+    bytes: int
+    hits: int
+    misses: int
+    expirations: int
+    evictions: int
+    refreshes: int
+    refresh_failures: int
+    loading: int
 
-class CacheGroup:
-    _cache: dict[int, "CachedObject"]
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
 
-    expires_delta: timedelta
-    expires_count: int
 
-    def __init__(self, expires_delta: timedelta, expires_count: int):
-        self._cache = {}
+class CacheGroup:
+    """
+    Entries in least recently used order, the oldest are evicted past `max_size` entries or `max_bytes`.
+    Aliases point other keys of an entry to it and go with it
+    """
+    _cache: OrderedDict[Key, "CachedObject"]
+    _aliases: dict[Key, Key]
+    _loading: dict[Key, asyncio.Task]
+    _bytes: int
+
+    expires_delta: timedelta | None
+    expires_count: int | None
+    max_size: int | None
+    max_bytes: int | None
+    key: KeyFunc | None
+    result_key: p.Callable[[p.Any], Key] | None
+    refresh_delta: timedelta | None
+    scope: Scope | None
+
+    hits: int
+    misses: int
+    expirations: int
+    evictions: int
+    refreshes: int
+    refresh_failures: int
+
+    REFRESH_RETRY = timedelta(seconds=30)
+
+    def __init__(self,
+                 expires_delta: timedelta | None,
+                 expires_count: int | None,
+                 max_size: int | None = None,
+                 max_bytes: int | None = None,
+                 key: KeyFunc | None = None,
+                 result_key: p.Callable[[p.Any], Key] | None = None,
+                 refresh_delta: timedelta | None = None):
+        self._cache = OrderedDict()
+        self._aliases = {}
+        self._loading = {}
+        self._bytes = 0
 
         self.expires_delta = expires_delta
         self.expires_count = expires_count
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.key = key
+        self.result_key = result_key
+        self.refresh_delta = refresh_delta
+        self.scope = None
+
+        self.reset_stats()
 
-    def add(self, obj: p.Any, hash: int) -> p.Any:
-        cache = CachedObject(obj, self.expires_delta, self.expires_count)
-        self._cache[hash] = cache
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def make_key(self, args: tuple, kwargs: dict) -> Key | None:
+        if self.key is not None:
+            return self.key(*args, **kwargs)
+        return key_gen(args, kwargs)
+
+    def add(self, obj: p.Any, key: Key) -> p.Any:
+        canonical = self.result_key(obj) if self.result_key is not None and obj is not None else key
+        self._remove(canonical)
+        self._remove(self._aliases.get(key, key))
+
+        cache = CachedObject(obj, self.expires_delta, self.expires_count, self.refresh_delta)
+        if self.max_bytes is not None:
+            cache.size = approximate_size(obj)
+            self._bytes += cache.size
+        if canonical != key:
+            cache.aliases = (key,)
+            self._aliases[key] = canonical
+
+        self._cache[canonical] = cache
+        while self._cache and self._over():
+            self._remove(next(iter(self._cache)))
+            self.evictions += 1
         return cache.cache
 
-    def get(self, hash: int) -> p.Any:
-        if hash in self._cache:
-            return self._cache[hash].cache
+    async def load(self, key: Key, call: p.Callable[[], p.Awaitable]) -> p.Any:
+        """
+        Concurrent misses of one key share a single call, its error reaches every waiter and is not cached.
+        The call runs as a task, a cancelled waiter does not cancel it for the others
+        """
+        task = self._loading.get(key)
+        if task is None:
+            task = self._loading[key] = asyncio.create_task(self._load(key, call))
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Key, call: p.Callable[[], p.Awaitable]) -> p.Any:
+        try:
+            return self.add(await self._call(call), key)
+        finally:
+            self._loading.pop(key, None)
+
+    def stale(self, key: Key) -> bool:
+        """
+        Past the soft ttl and not being loaded already
+        """
+        cache = self._cache.get(self._aliases.get(key, key))
+        if cache is None or cache.refresh_at is None or key in self._loading:
+            return False
+        return time.monotonic() >= cache.refresh_at
+
+    def refresh(self, key: Key, call: p.Callable[[], p.Awaitable]):
+        """
+        Reload in the background, misses of the key meanwhile wait for the same task
+        """
+        if key not in self._loading:
+            task = self._loading[key] = asyncio.create_task(self._refresh(key, call))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())  # failures are counted and logged
+
+    async def _refresh(self, key: Key, call: p.Callable[[], p.Awaitable]) -> p.Any:
+        try:
+            result = self.add(await self._call(call), key)
+            self.refreshes += 1
+            return result
+        except Exception as ex:
+            self.refresh_failures += 1
+            logging.warning(f"Cache refresh failed ({ex.__class__.__name__}:{ex})")
+            cache = self._cache.get(self._aliases.get(key, key))
+            if cache is not None:  # the stale value is kept until it expires, retried later
+                cache.refresh_at = time.monotonic() + self.REFRESH_RETRY.total_seconds()
+            raise
+        finally:
+            self._loading.pop(key, None)
+
+    async def _call(self, call: p.Callable[[], p.Awaitable]) -> p.Any:
+        if self.scope is None:
+            return await call()
+        async with self.scope():
+            return await call()
+
+    def get(self, key: Key) -> p.Any:
+        key = self._aliases.get(key, key)
+        cache = self._cache.get(key)
+        if cache is None:
+            self.misses += 1
+            return
+        result = cache.cache
+        if result is None:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+        else:
+            self._cache.move_to_end(key)
+            self.hits += 1
+        return result
 
-    def expire(self, hash: int | None = None):
-        if hash:
-            self._cache[hash].expire()
+    def expire(self, key: Key | None = None):
+        if key is not None:
+            self._remove(self._aliases.get(key, key))
         else:
-            for cache in self._cache.values():
-                cache.expire()
+            self._cache.clear()
+            self._aliases.clear()
+            self._bytes = 0
+
+    def sweep(self) -> int:
+        """
+        Drop expired entries, returns how many
+        """
+        now = time.monotonic()
+        expired = [k for k, cache in self._cache.items() if cache.expired_at(now)]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+        return len(expired)
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            size=len(self._cache),
+            bytes=self._bytes,
+            hits=self.hits,
+            misses=self.misses,
+            expirations=self.expirations,
+            evictions=self.evictions,
+            refreshes=self.refreshes,
+            refresh_failures=self.refresh_failures,
+            loading=len(self._loading)
+        )
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def _over(self) -> bool:
+        if self.max_size is not None and len(self._cache) > self.max_size:
+            return True
+        return self.max_bytes is not None and self._bytes > self.max_bytes
+
+    def _remove(self, key: Key):
+        cache = self._cache.pop(key, None)
+        if cache is not None:
+            self._bytes -= cache.size
+            for alias in cache.aliases:
+                self._aliases.pop(alias, None)
 
 
 class CachedObject:
+    __slots__ = ("_cache", "_get_count", "_expired", "expires_at", "expires_count", "refresh_at", "size", "aliases")
+
     _cache: p.Any
     _get_count: int
     _expired: bool
 
-    expires_date: datetime | None
+    expires_at: float | None  # time.monotonic()
     expires_count: int | None
+    refresh_at: float | None
+    size: int
+    aliases: tuple[Key, ...]
 
     def __init__(self,
                  cache: p.Any,
                  expires_delta: timedelta | None = None,
-                 expires_count: int | None = None):
+                 expires_count: int | None = None,
+                 refresh_delta: timedelta | None = None):
         self._cache = cache
         self._get_count = 0
         self._expired = False
 
-        self.expires_date = expires_delta + datetime.now() if expires_delta is not None else None
+        self.expires_at = time.monotonic() + expires_delta.total_seconds() if expires_delta is not None else None
         self.expires_count = expires_count
+        self.refresh_at = time.monotonic() + refresh_delta.total_seconds() if refresh_delta is not None else None
+        self.size = 0
+        self.aliases = ()
 
     def get(self):
         return self.cache
 
     def extend(self, extend_delta: timedelta | None = None, extend_count: int | None = None):
-        if extend_delta and self.expires_date:
-            self.expires_date += extend_delta
+        if extend_delta and self.expires_at:
+            self.expires_at += extend_delta.total_seconds()
         if extend_count and self.expires_count:
             self.expires_count += extend_count
 
     def expire(self):
         self._expired = True
 
-    @property
-    def expired(self) -> bool:
+    def expired_at(self, now: float) -> bool:
         expired = self._expired
         if self.expires_count is not None:
             expired = expired or self._get_count >= self.expires_count
-        if self.expires_date is not None:
-            expired = expired or datetime.now() >= self.expires_date
+        if self.expires_at is not None:
+            expired = expired or now >= self.expires_at
         return expired
 
+    @property
+    def expired(self) -> bool:
+        return self.expired_at(time.monotonic())
+
     @property
     def cache(self) -> p.Any | None:
         if not self.expired:
@@ -1,14 +1,25 @@
 from __future__ import annotations
 
 from datetime import timedelta
+from operator import attrgetter
 
 from aiogram import types as t, Bot
 
-from libs.database import chatOBJ
-from src.instances import Database, Cache
+from src.instances import Database, Cache, Retention
 from src.utils import get_value
 
 
+def chat_key(cls: type, auth: int | str | t.Chat) -> int | str:
+    """
+    Chat.create cache key: the id, or the username until it is resolved
+    """
+    if isinstance(auth, t.Chat):
+        return auth.id
+    if isinstance(auth, str):
+        return auth.lower().removeprefix("@")
+    return auth
+
+
 class Chat:
     chat: t.Chat
     chatOBJ: chatOBJ
@@ -20,10 +31,10 @@ class Chat:
     invite_link: str
     settings: dict
 
-    def __init__(self, chat: t.Chat, owner: t.User):
+    def __init__(self, chat: t.Chat, owner: t.User, chatOBJ: chatOBJ):
         self.chat = chat
         self.owner = owner
-        self.chatOBJ = Database.get_chat(chat.id, self.owner.id)
+        self.chatOBJ = chatOBJ
 
         self.id = chat.id
         self.type = chat.type
@@ -33,11 +44,14 @@ class Chat:
 
         self.settings = self.chatOBJ.settings
 
-        if self.chatOBJ.owner_id != self.owner.id:
-            self.chatOBJ.owner_id = self.owner.id
-
     @classmethod
-    @Cache.register(timedelta(minutes=10))
+    @Cache.register(
+        timedelta(hours=1),
+        refresh_delta=timedelta(minutes=10),
+        max_size=2000,
+        key=chat_key,
+        result_key=attrgetter("id")
+    )
     async def create(cls, auth: int | str | t.Chat) -> "Chat":
         from libs.user import User
         bot = Bot.get_current()
@@ -60,7 +74,11 @@ class Chat:
         except Exception:
             pass
 
-        return cls(chat, owner)
+        chatOBJ = await Database.get_chat(chat.id, owner.id)
+        if chatOBJ.owner_id != owner.id:  # written now, this may run in a background refresh
+            await chatOBJ.set("owner_id", owner.id)
+
+        return cls(chat, owner, chatOBJ)
 
     @property
     def mention(self):
@@ -84,6 +102,10 @@ class Chat:
     def statistic_mode(self) -> int:
         return get_value(self.settings, ["statistic", "mode"], default=1)
 
+    @property
+    def retention_days(self) -> int:
+        return Retention.window(get_value(self.settings, ["retention", "days"]))
+
     @property
     def report_command(self) -> str:
         return get_value(self.settings, ["report", "command"], default="/ban")
@@ -1,107 +1,412 @@
 from __future__ import annotations
 
-import logging
+import asyncio
+import functools
 import typing as p
-from copy import copy, deepcopy
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from copy import deepcopy
 from datetime import datetime, timedelta
 
 from aiogram.utils.json import loads, dumps
-from pymysql import connect
+from pymysql import connect, Connection
+from pymysql.constants import CLIENT
+from pymysql.cursors import SSCursor
+from pymysql.err import OperationalError, InterfaceError
+
+from libs.metrics import QueryMetrics
+
+if p.TYPE_CHECKING:
+    from libs.archive import Archive
 
 JSON_DEFAULT = {}
+INSERT_CHUNK = 1000
+IN_CHUNK = 512
+
+# Messages.type codes, append only
+MESSAGE_TYPES = (
+    "unknown",
+    "text",
+    "animation",
+    "audio",
+    "contact",
+    "dice",
+    "document",
+    "game",
+    "location",
+    "photo",
+    "poll",
+    "sticker",
+    "venue",
+    "video",
+    "video_note",
+    "voice",
+)
+MESSAGE_TYPE_CODES = {type: code for code, type in enumerate(MESSAGE_TYPES)}
+
+
+def is_empty(value: p.Any) -> bool:
+    return value is None or (isinstance(value, (str, list, dict)) and not value)
+
+
+def prune(value: p.Any) -> p.Any:
+    """
+    Copy of `value` without empty values, nested containers left empty are dropped too
+    """
+    if isinstance(value, dict):
+        result = {}
+        for k, v in value.items():
+            v = prune(v)
+            if not is_empty(v):
+                result[k] = v
+        return result
+    elif isinstance(value, list):
+        result = []
+        for v in value:
+            v = prune(v)
+            if not is_empty(v):
+                result.append(v)
+        return result
+    return value
+
 
+_REMOVED = object()
+
+
+class JsonDict(dict):
+    """
+    dict that records assigned and removed keys by path, nested dicts share the root's change log
+    """
+    __slots__ = ("_changes", "_path")
+
+    _changes: dict[tuple[str, ...], p.Any]
+    _path: tuple[str, ...]
+
+    def __init__(self,
+                 data: dict | None = None,
+                 changes: dict[tuple[str, ...], p.Any] | None = None,
+                 path: tuple[str, ...] = ()):
+        super().__init__()
+        self._changes = {} if changes is None else changes
+        self._path = path
+
+        for k, v in (data or {}).items():
+            dict.__setitem__(self, k, self._wrap(k, v))
+
+    def _wrap(self, key: str, value: p.Any) -> p.Any:
+        if isinstance(value, dict):
+            return JsonDict(value, self._changes, self._path + (key,))
+        return value
+
+    def _record(self, key: str, value: p.Any):
+        path = self._path + (key,)
+        for i in range(len(path)):
+            if path[:i] in self._changes:  # an assigned parent is written whole
+                return
+
+        for changed in [c for c in self._changes if c[:len(path)] == path]:
+            del self._changes[changed]
+        self._changes[path] = value
+
+    @property
+    def changed(self) -> bool:
+        return bool(self._changes)
+
+    def patch(self) -> tuple[dict, dict]:
+        """
+        JSON merge patches for the recorded changes: the first removes replaced objects, the second sets values
+        """
+        reset = {}
+        patch = {}
+        for path, value in self._changes.items():
+            value = None if value is _REMOVED else prune(value)
+            if is_empty(value):
+                value = None
+            elif isinstance(value, dict):
+                _put(reset, path, None)  # merge patches merge objects, reset to replace
+            _put(patch, path, value)
+
+        return reset, patch
+
+    def clear_changes(self):
+        self._changes.clear()
+
+    def __setitem__(self, key: str, value: p.Any):
+        value = self._wrap(key, value)
+        dict.__setitem__(self, key, value)
+        self._record(key, value)
 
-def clear_dict(d: dict):
-    d = deepcopy(d)
-    for k, v in copy(d).items():
-        if v is None or v == "" or v == [] or v == {}:
-            d.pop(k)
-        elif isinstance(v, dict):
-            clear_dict(v)
-        elif isinstance(v, list):
-            clear_list(v)
-    return d
+    def __delitem__(self, key: str):
+        dict.__delitem__(self, key)
+        self._record(key, _REMOVED)
 
+    def pop(self, key: str, *default: p.Any) -> p.Any:
+        if key in self:
+            self._record(key, _REMOVED)
+        return dict.pop(self, key, *default)
 
-def clear_list(l: list):
-    l = deepcopy(l)
-    for n, v in enumerate(copy(l)):
-        if v is None or v == "" or v == [] or v == {}:
-            l.pop(n)
-        elif isinstance(v, dict):
-            clear_dict(v)
-        elif isinstance(v, list):
-            clear_list(v)
-    return l
+    def setdefault(self, key: str, default: p.Any = None) -> p.Any:
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
 
+    def update(self, *args, **kwargs):
+        for k, v in dict(*args, **kwargs).items():
+            self[k] = v
 
-def format_delta(column: str, delta: timedelta, contain: bool = True):
-    from_date = datetime.now()
-    to_date = from_date - delta
+    def __deepcopy__(self, memo: dict) -> dict:
+        return deepcopy(dict(self), memo)
 
+
+def _put(d: dict, path: tuple[str, ...], value: p.Any):
+    for key in path[:-1]:
+        d = d.setdefault(key, {})
+        if d is None:
+            return
+    d[path[-1]] = value
+
+
+class Query(p.NamedTuple):
+    sql: str
+    args: tuple = ()
+
+
+Shape = tuple[tuple[str, p.Union[str, int]], ...]
+IN_TYPES = (list, tuple, set, frozenset, range)
+
+
+def to_param(value: p.Any) -> p.Any:
+    if isinstance(value, (dict, list)):
+        value = dumps(prune(value))
+    elif isinstance(value, timedelta):
+        value = int(value.total_seconds())
+
+    return value
+
+
+@functools.lru_cache(maxsize=None)
+def compile_delta(column: str, contain: bool = True) -> str:
     if contain:
-        result = f"{column}<={format_value(from_date)} AND {column}>={format_value(to_date)}"
+        return f"{column}<=NOW() AND {column}>=NOW() - INTERVAL %s SECOND"
     else:
-        result = f"{column}<{format_value(from_date)} AND {column}>{format_value(to_date)}"
+        return f"{column}<NOW() AND {column}>NOW() - INTERVAL %s SECOND"
 
-    return result
 
+def padded(size: int) -> int:
+    """
+    IN lists are padded to a power of two, so they compile to a few statement shapes
+    """
+    return 1 << (size - 1).bit_length() if size else 0
 
-def format_value(value: p.Any) -> str:
-    if isinstance(value, dict):
-        value = dumps(clear_dict(value))
-    elif isinstance(value, list):
-        value = dumps(clear_list(value))
-    elif isinstance(value, datetime):
-        value = value.isoformat(" ", "seconds")
 
-    if isinstance(value, str):
-        value = repr(value)
+@functools.lru_cache(maxsize=None)
+def compile_condition(column: str, op: str | int) -> str:
+    if op == "delta":
+        return compile_delta(column)
+    elif isinstance(op, int):
+        return f"{column} IN ({','.join(['%s'] * op)})" if op else "FALSE"
     else:
-        value = str(value)
+        return f"{column}=%s"
+
+
+def join_where(where: list[str]) -> str:
+    if where:
+        return f" WHERE {' AND '.join(where)}"
+    return ""
+
+
+@functools.lru_cache(maxsize=None)
+def compile_where(shape: Shape) -> str:
+    """
+    shape - (column, op) pairs in selector order, op is "=", "delta" or the IN list size
+    """
+    return join_where([compile_condition(k, op) for k, op in shape])
+
+
+@functools.lru_cache(maxsize=None)
+def compile_select(table: str, shape: Shape, columns: tuple[str, ...] = ()) -> str:
+    return f"SELECT {','.join(columns) or '*'} FROM {table}{compile_where(shape)}"
+
+
+@functools.lru_cache(maxsize=None)
+def compile_aggregate(table: str, aggregate: str, shape: Shape, group: tuple[str, ...] = ()) -> str:
+    if group:
+        columns = ",".join(group)
+        return f"SELECT {columns},{aggregate} FROM {table}{compile_where(shape)} GROUP BY {columns}"
+    return f"SELECT {aggregate} FROM {table}{compile_where(shape)}"
+
+
+def compile_count(table: str, shape: Shape, group: tuple[str, ...] = ()) -> str:
+    return compile_aggregate(table, "COUNT(*)", shape, group)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_page(table: str, shape: Shape, key: tuple[str, ...], after: bool) -> str:
+    """
+    Keyset page, newest first: rows with `key` below the last seen key
+    """
+    where = [compile_condition(k, op) for k, op in shape]
+    if after and len(key) > 1:
+        where.append(f"({','.join(key)})<({','.join(['%s'] * len(key))})")
+    elif after:
+        where.append(f"{key[0]}<%s")
+
+    order = ",".join(f"{k} DESC" for k in key)
+    return f"SELECT * FROM {table}{join_where(where)} ORDER BY {order} LIMIT %s"
 
-    return value
 
+@functools.lru_cache(maxsize=None)
+def compile_delete(table: str, shape: Shape) -> str:
+    return f"DELETE FROM {table}{compile_where(shape)}"
 
-def format_where(**selectors):
-    where = []
+
+@functools.lru_cache(maxsize=None)
+def compile_insert(table: str, columns: tuple[str, ...], ignore: bool = False) -> str:
+    insert = "INSERT IGNORE" if ignore else "INSERT"
+    return f"{insert} INTO {table}({','.join(columns)}) VALUES ({','.join(['%s'] * len(columns))})"
+
+
+@functools.lru_cache(maxsize=None)
+def compile_assignment(column: str, op: str) -> str:
+    if op == "patch":
+        return f"{column}=JSON_MERGE_PATCH({column},%s)"
+    elif op == "reset":
+        return f"{column}=JSON_MERGE_PATCH(JSON_MERGE_PATCH({column},%s),%s)"
+    else:
+        return f"{column}=%s"
+
+
+@functools.lru_cache(maxsize=None)
+def compile_update(table: str, columns: Shape, shape: Shape) -> str:
+    """
+    columns - (column, op) pairs, op is "=", "patch" or "reset" for JSON merge patches
+    """
+    values = ",".join(compile_assignment(c, op) for c, op in columns)
+    return f"UPDATE {table} SET {values}{compile_where(shape)}"
+
+
+def format_where(**selectors) -> tuple[Shape, tuple]:
+    shape = []
+    args = []
 
     for k, v in selectors.items():
-        if v is not None:
-            if isinstance(v, timedelta):
-                where.append(format_delta(k, v))
-            else:
-                where.append(f"{k}={format_value(v)}")
+        if v is None:
+            continue
+        elif isinstance(v, timedelta):
+            shape.append((k, "delta"))
+            args.append(to_param(v))
+        elif isinstance(v, IN_TYPES):
+            values = list(v)
+            size = padded(len(values))
+            shape.append((k, size))
+            args += values + values[-1:] * (size - len(values))
+        else:
+            shape.append((k, "="))
+            args.append(to_param(v))
+
+    return tuple(shape), tuple(args)
+
+
+def format_select(table: str, *columns: str, **selectors) -> Query:
+    shape, args = format_where(**selectors)
+    return Query(compile_select(table, shape, columns), args)
+
 
-    return f"WHERE {' AND '.join(where)}"
+def format_count(table: str, *group: str, **selectors) -> Query:
+    shape, args = format_where(**selectors)
+    return Query(compile_count(table, shape, group), args)
 
 
-def format_select(table: str, **selectors):
-    return f"SELECT * FROM {table} {format_where(**selectors)}"
+def format_sum(table: str, column: str, *group: str, **selectors) -> Query:
+    shape, args = format_where(**selectors)
+    return Query(compile_aggregate(table, f"SUM({column})", shape, group), args)
 
 
-def format_delete(table: str, **selectors):
-    return f"DELETE FROM {table} {format_where(**selectors)}"
+def format_delete(table: str, **selectors) -> Query:
+    shape, args = format_where(**selectors)
+    return Query(compile_delete(table, shape), args)
 
 
-def format_insert(table: str, **values):
-    val = []
-    col = []
+def format_insert(table: str, **values) -> Query:
+    values = {k: v for k, v in values.items() if v is not None}
+    return Query(compile_insert(table, tuple(values)), tuple(to_param(v) for v in values.values()))
+
+
+def format_insert_many(table: str, rows: list[dict[str, p.Any]]) -> Query:
+    columns = tuple(rows[0])
+    values = ",".join([f"({','.join(['%s'] * len(columns))})"] * len(rows))
+    args = tuple(to_param(row[c]) for row in rows for c in columns)
+    return Query(f"INSERT INTO {table}({','.join(columns)}) VALUES {values}", args)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_get_or_create(table: str, key: str, columns: tuple[str, ...]) -> str:
+    return f"{compile_insert(table, columns)} ON DUPLICATE KEY UPDATE {key}={key}; " \
+           f"{compile_select(table, ((key, '='),))}"
+
+
+def format_get_or_create(table: str, key: str, **values) -> Query:
+    """
+    Insert the row unless `key` already exists and select it, in one batch
+    """
+    values = {k: v for k, v in values.items() if v is not None}
+    return Query(
+        compile_get_or_create(table, key, tuple(values)),
+        (*(to_param(v) for v in values.values()), to_param(values[key]))
+    )
+
+
+class JsonPatch(p.NamedTuple):
+    reset: dict
+    patch: dict
+
+
+def format_update(table: str, values: dict[str, p.Any], **selectors) -> Query:
+    shape, args = format_where(**selectors)
+    columns = []
+    params = []
 
     for k, v in values.items():
-        if v is not None:
-            v = format_value(v)
-            col.append(k)
-            val.append(v)
+        if isinstance(v, JsonPatch) and v.reset:
+            columns.append((k, "reset"))
+            params += [dumps(v.reset), dumps(v.patch)]
+        elif isinstance(v, JsonPatch):
+            columns.append((k, "patch"))
+            params.append(dumps(v.patch))
+        else:
+            columns.append((k, "="))
+            params.append(to_param(v))
+
+    return Query(compile_update(table, tuple(columns), shape), (*params, *args))
+
+
+def type_code(type: str | int | None) -> int | None:
+    if type is None or isinstance(type, int):
+        return type
+    return MESSAGE_TYPE_CODES.get(type, 0)
+
 
-    val = ",".join(val)
-    col = ",".join(col)
+def type_name(code: int | str) -> str:
+    if isinstance(code, str):
+        return code
+    return MESSAGE_TYPES[code] if code < len(MESSAGE_TYPES) else MESSAGE_TYPES[0]
 
-    return f"INSERT INTO {table}({col}) VALUES ({val})"
+
+def message_row(values: dict[str, p.Any]) -> dict[str, p.Any]:
+    return {**values, "type": type_code(values.get("type"))}
+
+
+def message_stat_row(values: dict[str, p.Any]) -> dict[str, p.Any]:
+    return {**message_row(values), "day": values["date"].date()}
 
 
 def objects(l: list[tuple], o: p.Type) -> list[object]:
-    return [o(*i) for i in l]
+    return list(map(o._make, l))
+
+
+def chunks(l: list, size: int) -> p.Iterator[list]:
+    for i in range(0, len(l), size):
+        yield l[i:i + size]
 
 
 class LogType:
@@ -136,118 +441,300 @@ class LogType:
         ]
 
 
+_work: ContextVar["UnitOfWork | None"] = ContextVar("unit_of_work", default=None)
+
+
+class UnitOfWork:
+    """
+    Collects changed link objects, flush writes one UPDATE per row and commits once
+    """
+    _objects: dict[int, "_link_obj"]
+
+    database: "Database"
+
+    def __init__(self, database: "Database"):
+        self._objects = {}
+        self._token = None
+
+        self.database = database
+
+    @staticmethod
+    def current() -> "UnitOfWork | None":
+        return _work.get()
+
+    def open(self) -> "UnitOfWork":
+        self._token = _work.set(self)
+        return self
+
+    async def close(self, flush: bool = True):
+        try:
+            if flush:
+                await self.flush()
+            else:
+                self.discard()
+        finally:
+            if self._token is not None:
+                _work.reset(self._token)
+                self._token = None
+
+    def add(self, obj: "_link_obj"):
+        self._objects[id(obj)] = obj
+
+    def discard(self):
+        objects, self._objects = self._objects, {}
+        for obj in objects.values():
+            obj.discard()
+
+    async def flush(self):
+        objects, self._objects = self._objects, {}
+        taken = [(o, o._take()) for o in objects.values() if o.dirty]
+        taken = [(o, values) for o, values in taken if values]
+        if not taken:
+            return
+
+        try:
+            async with self.database.transaction():
+                for obj, values in taken:
+                    await obj._write(values)
+        except BaseException:
+            # the transaction is rolled back, so every object is pending again
+            for obj, values in taken:
+                obj._restore(values)
+            raise
+
+
+class json_column:
+    """
+    JSON column kept as text in slot `_<name>` until the first read
+    """
+    decode: p.Callable[[p.Any], p.Any]
+
+    def __init__(self, decode: p.Callable[[p.Any], p.Any] = lambda v: v):
+        self.decode = decode
+
+    def __set_name__(self, owner: p.Type, name: str):
+        self.slot = owner.__dict__[f"_{name}"]
+
+    def __get__(self, obj: p.Any, owner: p.Type | None = None) -> p.Any:
+        if obj is None:
+            return self
+
+        value = self.slot.__get__(obj)
+        if isinstance(value, (str, bytes)):
+            value = self.decode(loads(value))
+            self.slot.__set__(obj, value)
+        return value
+
+    def __set__(self, obj: p.Any, value: p.Any):
+        self.slot.__set__(obj, value)
+
+
 class _link_obj:
-    _init: bool
+    """
+    Writable row, assignments are written by the current unit of work
+    """
+    __slots__ = ("_dirty", "_patched")
 
-    _table: str
-    _links: list[str]
+    _dirty: dict[str, p.Any]
+    _patched: set[str]
 
-    def __init__(self, table: str, *links: str):
-        self._table = table
-        self._links = links
+    _table: p.ClassVar[str]
+    _links: p.ClassVar[tuple[str, ...]]
+    _columns: p.ClassVar[tuple[str, ...]]
 
-        self._init = True
+    def __init__(self):
+        object.__setattr__(self, "_dirty", {})
+        object.__setattr__(self, "_patched", set())
 
-    def set(self, name: str, value: p.Any):
+    @classmethod
+    def _make(cls, row: p.Iterable[p.Any]) -> "_link_obj":
+        return cls(*row)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._dirty)
+
+    async def set(self, name: str, value: p.Any):
+        """
+        Assign and write immediately
+        """
+        self._mark(name, value)
+        await self.flush()
+
+    async def flush(self):
+        values = self._take()
+        if not values:
+            return
+        try:
+            await self._write(values)
+        except BaseException:
+            self._restore(values)
+            raise
+
+    def discard(self):
+        """
+        Forget the pending changes, the assigned values are kept in memory only
+        """
+        for name in self._columns:  # json dicts changed in place are not marked until assigned
+            value = getattr(self, name)
+            if isinstance(value, JsonDict):
+                value.clear_changes()
+        object.__setattr__(self, "_dirty", {})
+        object.__setattr__(self, "_patched", set())
+
+    def _take(self) -> dict[str, p.Any]:
+        """
+        Pending values as they are written, the dirty state is cleared
+        """
+        values = self._dirty
+        patched = self._patched
+        object.__setattr__(self, "_dirty", {})
+        object.__setattr__(self, "_patched", set())
+
+        for name, value in list(values.items()):
+            if name in patched and not value.changed:
+                del values[name]
+            elif name in patched:
+                values[name] = JsonPatch(*value.patch())
+            if isinstance(value, JsonDict):
+                value.clear_changes()
+        return values
+
+    def _restore(self, values: dict[str, p.Any]):
+        """
+        After a failed write the columns are pending again, whole since their patches were cleared
+        """
+        for name in values:
+            self._dirty.setdefault(name, getattr(self, name))
+            self._patched.discard(name)
+
+    async def _write(self, values: dict[str, p.Any]):
         from src.instances import Database as db
 
         where = {}
         for l in self._links:
-            where[l] = self.__dict__[l]
+            where[l] = getattr(self, l)
 
-        if name in self.__dict__:
-            self.__dict__[name] = value
+        await db.update(format_update(self._table, values, **where))
 
-        sql = f"UPDATE {self._table} SET {name}={format_value(value)} {format_where(**where)}"
+    def _mark(self, name: str, value: p.Any):
+        if name in self._links:
+            raise AttributeError(f"{self.__class__.__name__}.{name} is a key column")
+        if name not in self._columns:
+            raise AttributeError(f"{self.__class__.__name__} has no column {name!r}")
 
-        db.update(sql)
+        # the tracked dict reassigned to itself only writes what changed in it
+        if isinstance(value, JsonDict) and value is getattr(self, name):
+            if name not in self._dirty:
+                self._patched.add(name)
+        else:
+            self._patched.discard(name)
 
-    def __getattr__(self, name: str):
-        return
+        object.__setattr__(self, name, value)
+        self._dirty[name] = value
 
     def __getitem__(self, name: str):
-        name = str(name)
-        if name in self.__dict__:
-            return self.__dict__[name]
+        return getattr(self, str(name), None)
 
     def __setattr__(self, key: str, value: p.Any):
         key = str(key)
-        if self._init:
-            self.set(key, value)
-        else:
-            self.__dict__[key] = value
+        if not hasattr(self, "_dirty"):  # still in __init__
+            object.__setattr__(self, key, value)
+            return
+
+        work = UnitOfWork.current()
+        if work is None:
+            raise RuntimeError(f"{self.__class__.__name__}.{key} changed outside of a unit of work, "
+                               f"use `await set({key!r}, ...)`")
+        self._mark(key, value)
+        work.add(self)
 
     def __setitem__(self, key: str, value: p.Any):
-        key = str(key)
-        if self._init:
-            self.set(key, value)
-        else:
-            self.__dict__[key] = value
+        self.__setattr__(key, value)
 
     def __str__(self):
         result = f"{self.__class__.__name__}:\n"
-        for col, val in self.__dict__.items():
-            if "_" not in col:
-                result += f"    {col}={format_value(val)}\n"
+        for col in self._columns:
+            result += f"    {col}={getattr(self, col)!r}\n"
 
         return result
 
 
 class userOBJ(_link_obj):
+    __slots__ = ("id", "_settings", "_permission")
+
+    _table = "Users"
+    _links = ("id",)
+    _columns = ("id", "settings", "permission")
+
     id: int
-    settings: dict
-    permission: dict
+    settings: JsonDict = json_column(JsonDict)
+    permission: dict = json_column()
 
     def __init__(self, id: int, settings: str, permission: str):
         self.id = id
-        self.settings = loads(settings)
-        self.permission = loads(permission)
+        self.settings = settings
+        self.permission = permission
 
-        super().__init__("Users", "id")
+        super().__init__()
 
 
 class chatOBJ(_link_obj):
+    __slots__ = ("id", "_settings", "owner_id")
+
+    _table = "Chats"
+    _links = ("id",)
+    _columns = ("id", "settings", "owner_id")
+
     id: int
-    settings: dict
-    owner_id: dict
+    settings: JsonDict = json_column(JsonDict)
+    owner_id: int
 
-    def __init__(self, id: str, settings: str, owner_id: int):
+    def __init__(self, id: int, settings: str, owner_id: int):
         self.id = id
-        self.settings = loads(settings)
+        self.settings = settings
         self.owner_id = owner_id
 
-        super().__init__("Chats", "id")
+        super().__init__()
 
 
-class messageOBJ(_link_obj):
+class _message_row(p.NamedTuple):
     user_id: int
     chat_id: int
-    message_id: str
+    message_id: int
     reply_message_id: int | None
     message: str | None
-    type: str
-    data: str
+    type: str | int
+    date: datetime
 
-    def __init__(self,
-                 user_id: int,
-                 chat_id: int,
-                 message_id: int,
-                 reply_message_id: int | None,
-                 message: str | None,
-                 type: str,
-                 date: datetime):
-        self.user_id = user_id
-        self.chat_id = chat_id
-        self.message_id = message_id
-        self.reply_message_id = reply_message_id
-        self.message = message
-        self.type = type
-        self.date = date
-
-        super().__init__("Messages", "chat_id", "user_id", "message_id")
-
-
-class logOBJ(_link_obj):
+
+class messageOBJ(_message_row):
+    """
+    Read-only Messages row
+    """
+    __slots__ = ()
+
+    @property
+    def type(self) -> str:
+        return type_name(self[5])
+
+
+class searchOBJ(p.NamedTuple):
+    """
+    MessageSearch row with its relevance
+    """
+    chat_id: int
+    message_id: int
+    user_id: int
+    date: datetime
+    message: str
+    score: float
+
+
+class logOBJ(p.NamedTuple):
+    """
+    Read-only Logs row
+    """
     log_id: int
     chat_id: int
     executor_id: int
@@ -255,39 +742,109 @@ class logOBJ(_link_obj):
     type: str
     date: datetime
 
-    def __init__(self,
-                 log_id: int,
-                 chat_id: int,
-                 executor_id: int,
-                 target_id: int,
-                 type: str,
-                 date: datetime):
-        self.log_id = log_id
-        self.chat_id = chat_id
-        self.executor_id = executor_id
-        self.target_id = target_id
-        self.type = type
-        self.date = date
-
-        super().__init__("Logs", "log_id")
+
+class Checkout:
+    connect: Connection
+    task: asyncio.Task | None
+    depth: int  # open transaction scopes, 0 - none
+
+    def __init__(self, connect: Connection):
+        self.connect = connect
+        self.task = asyncio.current_task()
+        self.depth = 0
+
+    @property
+    def current(self) -> bool:
+        return self.task is asyncio.current_task()
+
+
+_checkout: ContextVar[Checkout | None] = ContextVar("database_checkout", default=None)
+
+
+class Pool:
+    """
+    Bounded pool of PyMySQL connections, blocking calls are run in the default executor
+    """
+    _free: asyncio.Queue | None
+    _created: int
+
+    size: int
+
+    def __init__(self, size: int, **kwargs):
+        self._free = None
+        self._created = 0
+        self._kwargs = kwargs
+
+        self.size = size
+
+    @property
+    def free(self) -> asyncio.Queue:
+        if self._free is None:
+            self._free = asyncio.Queue()
+        return self._free
+
+    async def acquire(self) -> Connection:
+        while True:
+            if self.free.empty() and self._created < self.size:
+                self._created += 1
+                try:
+                    return await asyncio.to_thread(connect, **self._kwargs)
+                except Exception:
+                    self._created -= 1
+                    raise
+
+            connection = await self.free.get()
+            if connection is not None:
+                return connection
+            # a discarded connection left a free slot, a new one is opened by the waiter
+
+    def release(self, connection: Connection):
+        self.free.put_nowait(connection)
+
+    def discard(self, connection: Connection):
+        self._created -= 1
+        self.free.put_nowait(None)  # wake a waiter, if any
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    async def close(self):
+        while not self.free.empty():
+            connection = self.free.get_nowait()
+            if connection is not None:
+                self._created -= 1
+                await asyncio.to_thread(connection.close)
 
 
 class Database:
-    connect: connect
-    autocommit: bool
+    pool: Pool
+    archive: "Archive | None"
+    metrics: QueryMetrics
 
-    def __init__(self, user: str, password: str, host: str, database: str, autocommit: bool = True):
-        self.autocommit = autocommit
-        self.connect = connect(
+    def __init__(self,
+                 user: str,
+                 password: str,
+                 host: str,
+                 database: str,
+                 pool_size: int = 10,
+                 archive: "Archive | None" = None,
+                 slow_query: timedelta = timedelta(milliseconds=500)):
+        self.archive = archive
+        self.metrics = QueryMetrics(slow_query)
+        self.pool = Pool(
+            pool_size,
             user=user,
             password=password,
             host=host,
-            database=database
+            database=database,
+            autocommit=True,  # a plain read must not open a snapshot that outlives it
+            client_flag=CLIENT.MULTI_STATEMENTS
         )
 
     # SETTERS
-    def add_user(self, id: int) -> userOBJ:
-        self.update(
+    async def add_user(self, id: int) -> userOBJ:
+        await self.update(
             format_insert(
                 "Users",
                 id=id,
@@ -295,10 +852,10 @@ class Database:
                 permissions=JSON_DEFAULT
             )
         )
-        return self.get_last_user()
+        return userOBJ(id, dumps(JSON_DEFAULT), dumps(JSON_DEFAULT))
 
-    def add_chat(self, id: int, owner_id: int) -> chatOBJ:
-        self.update(
+    async def add_chat(self, id: int, owner_id: int) -> chatOBJ:
+        await self.update(
             format_insert(
                 "Chats",
                 id=id,
@@ -306,17 +863,17 @@ class Database:
                 owner_id=owner_id
             )
         )
-        return self.get_last_chat()
-
-    def add_message(self,
-                    user_id: int,
-                    chat_id: int,
-                    message_id: int,
-                    reply_message_id: int | None = None,
-                    message: str | None = None,
-                    type: str | None = None,
-                    date: datetime | None = None) -> messageOBJ:
-        self.update(
+        return chatOBJ(id, dumps(JSON_DEFAULT), owner_id)
+
+    async def add_message(self,
+                          user_id: int,
+                          chat_id: int,
+                          message_id: int,
+                          reply_message_id: int | None = None,
+                          message: str | None = None,
+                          type: str | None = None,
+                          date: datetime | None = None) -> messageOBJ:
+        await self.update(
             format_insert(
                 "Messages",
                 user_id=user_id,
@@ -324,19 +881,19 @@ class Database:
                 message_id=message_id,
                 reply_message_id=reply_message_id,
                 message=message,
-                type=type,
+                type=type_code(type),
                 date=date
             )
         )
-        return self.get_last_message()
-
-    def add_log(self,
-                chat_id: int,
-                executor_id: int,
-                target_id: int,
-                type: str,
-                date: datetime) -> logOBJ:
-        self.update(
+        return messageOBJ(user_id, chat_id, message_id, reply_message_id, message, type, date)
+
+    async def add_log(self,
+                      chat_id: int,
+                      executor_id: int,
+                      target_id: int,
+                      type: str,
+                      date: datetime) -> logOBJ:
+        log_id = await self.update(
             format_insert(
                 "Logs",
                 chat_id=chat_id,
@@ -346,51 +903,110 @@ class Database:
                 date=date
             )
         )
-        return self.get_last_log()
+        return logOBJ(log_id, chat_id, executor_id, target_id, type, date)
+
+    # MANY SETTERS
+    async def add_users_many(self, ids: list[int]) -> list[userOBJ]:
+        for chunk in chunks(ids, INSERT_CHUNK):
+            await self.update(
+                format_insert_many(
+                    "Users",
+                    [dict(id=id, settings=JSON_DEFAULT, permissions=JSON_DEFAULT) for id in chunk]
+                )
+            )
+        return [userOBJ(id, dumps(JSON_DEFAULT), dumps(JSON_DEFAULT)) for id in ids]
+
+    async def add_chats_many(self, chats: list[tuple[int, int]]) -> list[chatOBJ]:
+        """
+        chats - (id, owner_id) pairs
+        """
+        for chunk in chunks(chats, INSERT_CHUNK):
+            await self.update(
+                format_insert_many(
+                    "Chats",
+                    [dict(id=id, settings=JSON_DEFAULT, owner_id=owner_id) for id, owner_id in chunk]
+                )
+            )
+        return [chatOBJ(id, dumps(JSON_DEFAULT), owner_id) for id, owner_id in chats]
+
+    async def add_messages_many(self, messages: list[dict[str, p.Any]]) -> list[messageOBJ]:
+        """
+        messages - add_message keyword arguments for every row
+        """
+        columns = ["user_id", "chat_id", "message_id", "reply_message_id", "message", "type", "date"]
+        rows = [{c: m.get(c) for c in columns} for m in messages]
+
+        for chunk in chunks(rows, INSERT_CHUNK):
+            await self.update(format_insert_many("Messages", [message_row(row) for row in chunk]))
+        return [messageOBJ(**row) for row in rows]
+
+    async def add_logs_many(self, logs: list[dict[str, p.Any]]) -> list[logOBJ]:
+        """
+        logs - add_log keyword arguments for every row
+        """
+        columns = ["chat_id", "executor_id", "target_id", "type", "date"]
+        rows = [{c: l[c] for c in columns} for l in logs]
+        result = []
+
+        for chunk in chunks(rows, INSERT_CHUNK):
+            # a single multi-row INSERT gets consecutive ids starting from lastrowid
+            first_id = await self.update(format_insert_many("Logs", chunk))
+            result += [logOBJ(first_id + n, **row) for n, row in enumerate(chunk)]
+        return result
 
     # ONE GETTER
-    def get_user(self, id: int) -> userOBJ:
-        result = self.get(
-            format_select(
+    async def get_user(self, id: int) -> userOBJ:
+        result = await self.get_batch(
+            format_get_or_create(
                 "Users",
-                id=id
+                "id",
+                id=id,
+                settings=JSON_DEFAULT,
+                permissions=JSON_DEFAULT
             ),
             True
         )
-        if not result:
-            return self.add_user(id)
-
         return userOBJ(*result)
 
-    def get_chat(self, id: id, owner_id: int | None = None) -> chatOBJ:
-        result = self.get(
-            format_select(
-                "Chats",
-                id=id
-            ),
-            True
-        )
+    async def get_chat(self, id: id, owner_id: int | None = None) -> chatOBJ:
+        if owner_id is None:
+            result = await self.get(
+                format_select(
+                    "Chats",
+                    id=id
+                ),
+                True
+            )
+        else:
+            result = await self.get_batch(
+                format_get_or_create(
+                    "Chats",
+                    "id",
+                    id=id,
+                    settings=JSON_DEFAULT,
+                    owner_id=owner_id
+                ),
+                True
+            )
         if not result:
-            if id is not None and owner_id is not None:
-                return self.add_chat(id, owner_id)
             return
 
         return chatOBJ(*result)
 
-    def get_message(self,
-                    user_id: int | None = None,
-                    chat_id: int | None = None,
-                    message_id: int | None = None,
-                    reply_message_id: int | None = None,
-                    message: str | None = None,
-                    type: str | None = None,
-                    delta: timedelta | None = None) -> messageOBJ:
+    async def get_message(self,
+                          user_id: int | None = None,
+                          chat_id: int | None = None,
+                          message_id: int | None = None,
+                          reply_message_id: int | None = None,
+                          message: str | None = None,
+                          type: str | None = None,
+                          delta: timedelta | None = None) -> messageOBJ:
         if message_id is None:
             raise ValueError("message_id is required")
         if chat_id is None:
             raise ValueError("chat_id is required")
 
-        result = self.get(
+        result = await self.get(
             format_select(
                 "Messages",
                 user_id=user_id,
@@ -398,21 +1014,21 @@ class Database:
                 message_id=message_id,
                 reply_message_id=reply_message_id,
                 message=message,
-                type=type,
+                type=type_code(type),
                 date=delta
             ),
             True
         )
         return messageOBJ(*result)
 
-    def get_log(self,
-                log_id: int,
-                chat_id: int | None = None,
-                executor_id: int | None = None,
-                target_id: int | None = None,
-                type: str | None = None,
-                delta: timedelta | None = None) -> logOBJ:
-        result = self.get(
+    async def get_log(self,
+                      log_id: int,
+                      chat_id: int | None = None,
+                      executor_id: int | None = None,
+                      target_id: int | None = None,
+                      type: str | None = None,
+                      delta: timedelta | None = None) -> logOBJ:
+        result = await self.get(
             format_select(
                 "Logs",
                 log_id=log_id,
@@ -420,18 +1036,18 @@ class Database:
                 executor_id=executor_id,
                 target_id=target_id,
                 type=type,
-                delta=delta
+                date=delta
             ),
             True
         )
         return logOBJ(*result)
 
     # MANY GETTER
-    def get_users(self,
-                  id: int | None = None,
-                  settings: dict | None = None,
-                  permissions: dict | None = None) -> list[userOBJ]:
-        result = self.get(
+    async def get_users(self,
+                        id: int | None = None,
+                        settings: dict | None = None,
+                        permissions: dict | None = None) -> list[userOBJ]:
+        result = await self.get(
             format_select(
                 "Users",
                 id=id,
@@ -442,11 +1058,11 @@ class Database:
 
         return objects(result, userOBJ)
 
-    def get_chats(self,
-                  id: int | None = None,
-                  settings: dict | None = None,
-                  owner_id: int | None = None) -> list[chatOBJ]:
-        result = self.get(
+    async def get_chats(self,
+                        id: int | None = None,
+                        settings: dict | None = None,
+                        owner_id: int | None = None) -> list[chatOBJ]:
+        result = await self.get(
             format_select(
                 "Chats",
                 id=id,
@@ -457,15 +1073,15 @@ class Database:
 
         return objects(result, chatOBJ)
 
-    def get_messages(self,
-                     user_id: int | None = None,
-                     chat_id: int | None = None,
-                     message_id: int | None = None,
-                     reply_message_id: int | None = None,
-                     message: str | None = None,
-                     type: str | None = None,
-                     delta: timedelta | None = None) -> list[messageOBJ]:
-        result = self.get(
+    async def get_messages(self,
+                           user_id: int | None = None,
+                           chat_id: int | None = None,
+                           message_id: int | None = None,
+                           reply_message_id: int | None = None,
+                           message: str | None = None,
+                           type: str | None = None,
+                           delta: timedelta | None = None) -> list[messageOBJ]:
+        result = await self.get(
             format_select(
                 "Messages",
                 user_id=user_id,
@@ -473,21 +1089,44 @@ class Database:
                 message_id=message_id,
                 reply_message_id=reply_message_id,
                 message=message,
-                type=type,
+                type=type_code(type),
                 date=delta
             )
         )
 
         return objects(result, messageOBJ)
 
-    def get_logs(self,
-                 log_id: int | None = None,
-                 chat_id: int | None = None,
-                 executor_id: int | None = None,
-                 target_id: int | None = None,
-                 type: str | None = None,
-                 delta: timedelta | None = None) -> list[logOBJ]:
-        result = self.get(
+    async def get_message_ids(self,
+                              chat_id: int,
+                              user_ids: p.Collection[int] | None = None,
+                              since: timedelta | None = None) -> list[int]:
+        result = await self.get(
+            format_select(
+                "Messages",
+                "message_id",
+                chat_id=chat_id,
+                user_id=user_ids,
+                date=since
+            )
+        )
+
+        ids = [i for i, in result]
+        if self.archive is not None:
+            # days past the hot window are only in segments, a partition is archived before it is dropped
+            seen = set(ids)
+            async for message in self.archive.iter_messages(chat_id, user_id=user_ids, delta=since):
+                if message.message_id not in seen:
+                    ids.append(message.message_id)
+        return ids
+
+    async def get_logs(self,
+                       log_id: int | None = None,
+                       chat_id: int | None = None,
+                       executor_id: int | None = None,
+                       target_id: int | None = None,
+                       type: str | None = None,
+                       delta: timedelta | None = None) -> list[logOBJ]:
+        result = await self.get(
             format_select(
                 "Logs",
                 log_id=log_id,
@@ -502,24 +1141,168 @@ class Database:
         return objects(result, logOBJ)
 
     # ALL GETTER
-    def get_all_users(self, size: int | None = None) -> list[userOBJ]:
-        return objects(self.get("SELECT * FROM Users", size=size), userOBJ)
+    async def get_all_users(self, size: int | None = None) -> list[userOBJ]:
+        return objects(await self.get("SELECT * FROM Users", size=size), userOBJ)
+
+    async def get_all_chats(self, size: int | None = None) -> list[chatOBJ]:
+        return objects(await self.get("SELECT * FROM Chats", size=size), chatOBJ)
+
+    async def get_all_messages(self, size: int | None = None) -> list[messageOBJ]:
+        return objects(await self.get("SELECT * FROM Messages", size=size), messageOBJ)
+
+    async def get_all_logs(self, size: int | None = None) -> list[logOBJ]:
+        return objects(await self.get("SELECT * FROM Logs", size=size), logOBJ)
+
+    # COUNTERS
+    async def count_logs(self,
+                         chat_id: int | None = None,
+                         executor_id: int | None = None,
+                         target_id: int | None = None,
+                         type: str | None = None,
+                         delta: timedelta | None = None) -> int:
+        result = await self.get(
+            format_count(
+                "Logs",
+                chat_id=chat_id,
+                executor_id=executor_id,
+                target_id=target_id,
+                type=type,
+                date=delta
+            ),
+            True
+        )
+
+        return result[0]
+
+    async def count_logs_by_target(self,
+                                   target_ids: p.Collection[int],
+                                   chat_id: int | None = None,
+                                   executor_id: int | None = None,
+                                   type: str | None = None,
+                                   delta: timedelta | None = None) -> dict[int, int]:
+        result = await self.get(
+            format_count(
+                "Logs",
+                "target_id",
+                chat_id=chat_id,
+                executor_id=executor_id,
+                target_id=target_ids,
+                type=type,
+                date=delta
+            )
+        )
+
+        counts = {id: 0 for id in target_ids}
+        counts.update(result)
+        return counts
+
+    async def search_messages(self, chat_id: int, query: str, limit: int = 10, offset: int = 0) -> list[searchOBJ]:
+        """
+        FULLTEXT natural language search, most relevant and then newest first
+        """
+        result = await self.get(Query(
+            "SELECT chat_id,message_id,user_id,date,message,MATCH(message) AGAINST(%s) AS score "
+            "FROM MessageSearch WHERE chat_id=%s AND MATCH(message) AGAINST(%s) "
+            "ORDER BY score DESC,message_id DESC LIMIT %s OFFSET %s",
+            (query, chat_id, query, limit, offset)
+        ))
+        return objects(result, searchOBJ)
+
+    async def sum_message_stats(self,
+                                *group: str,
+                                chat_id: int | None = None,
+                                user_id: int | None = None,
+                                type: str | None = None,
+                                delta: timedelta | None = None) -> list[tuple]:
+        """
+        Message counts from the MessageStats rollup, (*group, count) rows
+        group - chat_id, user_id, day or type
+        """
+        result = await self.get(
+            format_sum(
+                "MessageStats",
+                "count",
+                *group,
+                chat_id=chat_id,
+                user_id=user_id,
+                type=type_code(type),
+                day=delta
+            )
+        )
+        return [(*row[:-1], int(row[-1] or 0)) for row in result]
+
+    # ITERATORS
+    async def iter_messages(self,
+                            user_id: int | None = None,
+                            chat_id: int | None = None,
+                            reply_message_id: int | None = None,
+                            message: str | None = None,
+                            type: str | None = None,
+                            delta: timedelta | None = None,
+                            size: int = 1000) -> p.AsyncIterator[messageOBJ]:
+        """
+        Hot rows, then the archived ones, both newest first
+        """
+        # message_id is only unique inside a chat
+        key = ("message_id",) if chat_id is not None else ("chat_id", "message_id")
+        selectors = dict(user_id=user_id, reply_message_id=reply_message_id, message=message, type=type_code(type))
+        last = None
+
+        async for last in self._iter("Messages", messageOBJ, key, size, chat_id=chat_id, date=delta, **selectors):
+            yield last
+
+        if self.archive is not None:
+            # a partition is archived before it is dropped, skip what was already read from it
+            before = last.message_id if last is not None and chat_id is not None else None
+            async for message in self.archive.iter_messages(chat_id, before, delta=delta, **selectors):
+                yield message
+
+    async def iter_logs(self,
+                        chat_id: int | None = None,
+                        executor_id: int | None = None,
+                        target_id: int | None = None,
+                        type: str | None = None,
+                        delta: timedelta | None = None,
+                        size: int = 1000) -> p.AsyncIterator[logOBJ]:
+        async for log in self._iter(
+                "Logs",
+                logOBJ,
+                ("log_id",),
+                size,
+                chat_id=chat_id,
+                executor_id=executor_id,
+                target_id=target_id,
+                type=type,
+                date=delta
+        ):
+            yield log
+
+    async def _iter(self, table: str, o: p.Type, key: tuple[str, ...], size: int, **selectors):
+        """
+        Keyset pagination, only one page of `size` rows is held at a time and no connection is kept between pages
+        """
+        shape, args = format_where(**selectors)
+        last = None
 
-    def get_all_chats(self, size: int | None = None) -> list[chatOBJ]:
-        return objects(self.get("SELECT * FROM Chats", size=size), chatOBJ)
+        while True:
+            query = Query(compile_page(table, shape, key, last is not None), (*args, *(last or ()), size))
+            rows = await self.get(query, unbuffered=True)
 
-    def get_all_messages(self, size: int | None = None) -> list[messageOBJ]:
-        return objects(self.get("SELECT * FROM Messages", size=size), messageOBJ)
+            obj = None
+            for row in rows:
+                obj = o._make(row)
+                yield obj
 
-    def get_all_logs(self, size: int | None = None) -> list[logOBJ]:
-        return objects(self.get("SELECT * FROM Logs", size=size), logOBJ)
+            if obj is None or len(rows) < size:
+                return
+            last = tuple(getattr(obj, k) for k in key)
 
     # DELETER
-    def delete_users(self,
-                     id: int | None = None,
-                     settings: dict | None = None,
-                     permissions: dict | None = None):
-        self.update(
+    async def delete_users(self,
+                           id: int | None = None,
+                           settings: dict | None = None,
+                           permissions: dict | None = None):
+        await self.update(
             format_delete(
                 "Users",
                 id=id,
@@ -527,12 +1310,18 @@ class Database:
                 permissions=permissions
             )
         )
-
-    def delete_chats(self,
-                     id: int | None = None,
-                     settings: dict | None = None,
-                     owner_id: int | None = None):
-        self.update(
+        if id is not None:  # Messages is partitioned and has no foreign keys to cascade
+            await self.update(format_delete("Messages", user_id=id))
+            await self.update(format_delete("MessageStats", user_id=id))
+            await self.update(format_delete("MessageSearch", user_id=id))
+            if self.archive is not None:
+                await self.archive.delete(user_id=id)
+
+    async def delete_chats(self,
+                           id: int | None = None,
+                           settings: dict | None = None,
+                           owner_id: int | None = None):
+        await self.update(
             format_delete(
                 "Chats",
                 id=id,
@@ -540,36 +1329,63 @@ class Database:
                 owner_id=owner_id
             )
         )
-
-    def delete_messages(self,
-                        user_id: int | None = None,
-                        chat_id: int | None = None,
-                        message_id: int | None = None,
-                        reply_message_id: int | None = None,
-                        message: str | None = None,
-                        type: str | None = None,
-                        delta: timedelta | None = None):
-        self.update(
-            format_delete(
-                "Messages",
+        if id is not None:
+            await self.update(format_delete("Messages", chat_id=id))
+            await self.update(format_delete("MessageStats", chat_id=id))
+            await self.update(format_delete("MessageSearch", chat_id=id))
+            if self.archive is not None:
+                await self.archive.delete_chat(id)
+
+    async def delete_messages(self,
+                              user_id: int | p.Collection[int] | None = None,
+                              chat_id: int | None = None,
+                              message_id: int | p.Collection[int] | None = None,
+                              reply_message_id: int | None = None,
+                              message: str | None = None,
+                              type: str | None = None,
+                              delta: timedelta | None = None):
+        message_ids = message_id if isinstance(message_id, IN_TYPES) else [message_id]
+        # MessageSearch has no reply or type columns, texts are only removed for selectors it has
+        search = reply_message_id is None and type is None
+
+        for chunk in chunks(list(message_ids), IN_CHUNK):
+            selectors = dict(
                 user_id=user_id,
                 chat_id=chat_id,
+                message_id=chunk if isinstance(message_id, IN_TYPES) else message_id,
+                message=message,
+                date=delta,
+            )
+            await self.update(
+                format_delete(
+                    "Messages",
+                    reply_message_id=reply_message_id,
+                    type=type_code(type),
+                    **selectors
+                )
+            )
+            if search:
+                await self.update(format_delete("MessageSearch", **selectors))
+
+        if self.archive is not None:
+            await self.archive.delete(
+                chat_id,
+                delta,
+                user_id=user_id,
                 message_id=message_id,
                 reply_message_id=reply_message_id,
                 message=message,
-                type=type,
-                date=delta,
+                type=type
             )
-        )
 
-    def delete_logs(self,
-                    log_id: int | None = None,
-                    chat_id: int | None = None,
-                    executor_id: int | None = None,
-                    target_id: int | None = None,
-                    type: str | None = None,
-                    delta: timedelta | None = None):
-        self.update(
+    async def delete_logs(self,
+                          log_id: int | None = None,
+                          chat_id: int | None = None,
+                          executor_id: int | None = None,
+                          target_id: int | None = None,
+                          type: str | None = None,
+                          delta: timedelta | None = None):
+        await self.update(
             format_delete(
                 "Logs",
                 log_id=log_id,
@@ -581,24 +1397,49 @@ class Database:
             )
         )
 
-    # GET LAST
-    def get_last_user(self) -> userOBJ:
-        return userOBJ(*self.get("SELECT * FROM Users ORDER BY id DESC LIMIT 1", True))
-
-    def get_last_chat(self) -> chatOBJ:
-        return chatOBJ(*self.get("SELECT * FROM Chats ORDER BY id DESC LIMIT 1", True))
-
-    def get_last_message(self) -> messageOBJ:
-        return messageOBJ(*self.get("SELECT * FROM Messages ORDER BY message_id DESC LIMIT 1", True))
+    # LOW LEVEL GETTER
+    async def get(self,
+                  query: Query | str,
+                  one: bool = False,
+                  size: int = None,
+                  unbuffered: bool = False) -> list[tuple] | tuple:
+        query = Query(query) if isinstance(query, str) else query
+        async with self.connection() as checkout:
+            with self.metrics.measure(query.sql, query.args) as measure:
+                result = await asyncio.to_thread(self._get, checkout.connect, query, one, size, unbuffered)
+                measure.rows = (result is not None) if one else len(result)
+        return result
 
-    def get_last_log(self) -> logOBJ:
-        return logOBJ(*self.get("SELECT * FROM Logs ORDER BY log_id DESC LIMIT 1", True))
+    async def get_batch(self, query: Query, one: bool = False) -> list[tuple] | tuple:
+        """
+        Execute several statements at once and fetch the result of the last one
+        """
+        async with self.connection() as checkout:
+            with self.metrics.measure(query.sql, query.args) as measure:
+                result = await asyncio.to_thread(self._get_batch, checkout.connect, query, one)
+                measure.rows = (result is not None) if one else len(result)
+        return result
 
-    # LOW LEVEL GETTER
-    def get(self, sql: str, one: bool = False, size: int = None) -> list[tuple] | tuple:
-        logging.debug(f"Getting from database:\n    {sql}")
-        with self.connect.cursor() as cursor:
-            cursor.execute(sql)
+    async def update(self, query: Query | str) -> int:
+        query = Query(query) if isinstance(query, str) else query
+        async with self.connection() as checkout:
+            with self.metrics.measure(query.sql, query.args):
+                return await asyncio.to_thread(self._update, checkout.connect, query)
+
+    async def update_many(self, sql: str, rows: list[tuple]):
+        async with self.connection() as checkout:
+            with self.metrics.measure(sql, f"{len(rows)} rows") as measure:
+                await asyncio.to_thread(self._update_many, checkout.connect, sql, rows)
+                measure.rows = len(rows)
+
+    @staticmethod
+    def _get(connection: Connection,
+             query: Query,
+             one: bool,
+             size: int | None,
+             unbuffered: bool) -> list[tuple] | tuple:
+        with connection.cursor(SSCursor if unbuffered else None) as cursor:
+            cursor.execute(query.sql, query.args or None)
             if one:
                 return cursor.fetchone()
             else:
@@ -607,23 +1448,117 @@ class Database:
                 else:
                     return cursor.fetchall()
 
-    def update(self, sql: str):
-        logging.debug(f"Updating database:\n    {sql}")
-        with self.connect.cursor() as cursor:
-            cursor.execute(sql)
-
-        if self.autocommit:
-            self.commit()
+    @staticmethod
+    def _get_batch(connection: Connection, query: Query, one: bool) -> list[tuple] | tuple:
+        with connection.cursor() as cursor:
+            cursor.execute(query.sql, query.args or None)
+            result = cursor.fetchall()
+            while cursor.nextset():
+                result = cursor.fetchall()
 
-    def commit(self):
-        self.connect.commit()
-
-    # ANY
+        if one:
+            return result[0] if result else None
+        return result
 
-    def disable_autocommit(self):
-        self.commit()
-        self.autocommit = False
+    @staticmethod
+    def _update(connection: Connection, query: Query) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute(query.sql, query.args or None)
+            return cursor.lastrowid
+
+    @staticmethod
+    def _update_many(connection: Connection, sql: str, rows: list[tuple]):
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, rows)  # INSERT ... VALUES is sent as multi-row statements
+
+    # CONNECTION
+    @asynccontextmanager
+    async def connection(self) -> p.AsyncIterator[Checkout]:
+        """
+        Checkout a connection for the current coroutine, nested calls reuse it
+        """
+        checkout = _checkout.get()
+        if checkout is not None and checkout.current:
+            yield checkout
+            return
 
-    def enable_autocommit(self):
-        self.commit()
-        self.autocommit = True
+        checkout = Checkout(await self.pool.acquire())
+        token = _checkout.set(checkout)
+        broken = False
+        try:
+            yield checkout
+        except (OperationalError, InterfaceError, asyncio.CancelledError):
+            broken = True
+            raise
+        finally:
+            _checkout.reset(token)
+            if broken:
+                self.pool.discard(checkout.connect)
+            else:
+                self.pool.release(checkout.connect)
+
+    async def close(self):
+        await self.pool.close()
+
+    # UNIT OF WORK
+    @asynccontextmanager
+    async def unit_of_work(self) -> p.AsyncIterator[UnitOfWork]:
+        """
+        Link objects changed inside are written on exit, dropped on error
+        """
+        work = UnitOfWork(self).open()
+        try:
+            yield work
+        except BaseException:
+            await work.close(flush=False)
+            raise
+        else:
+            await work.close()
+
+    async def flush(self):
+        """
+        Write the pending changes of the current unit of work
+        """
+        work = UnitOfWork.current()
+        if work is not None:
+            await work.flush()
+
+    # TRANSACTION
+    @asynccontextmanager
+    async def transaction(self) -> p.AsyncIterator[Checkout]:
+        """
+        Statements of the current coroutine share one connection and one commit, rolled back on error.
+        Nested scopes are savepoints, an error inside only undoes the nested part
+        """
+        async with self.connection() as checkout:
+            if checkout.depth:
+                async with self._savepoint(checkout):
+                    yield checkout
+                return
+
+            checkout.depth = 1
+            try:
+                await asyncio.to_thread(checkout.connect.begin)
+                yield checkout
+            except BaseException:
+                await asyncio.to_thread(checkout.connect.rollback)
+                raise
+            else:
+                await asyncio.to_thread(checkout.connect.commit)
+            finally:
+                checkout.depth = 0
+
+    @asynccontextmanager
+    async def _savepoint(self, checkout: Checkout) -> p.AsyncIterator[Checkout]:
+        name = f"savepoint_{checkout.depth}"
+        await self.update(f"SAVEPOINT {name}")
+        checkout.depth += 1
+        try:
+            yield checkout
+        except BaseException:
+            await self.update(f"ROLLBACK TO SAVEPOINT {name}")
+            raise
+        else:
+            await self.update(f"RELEASE SAVEPOINT {name}")
+        finally:
+            checkout.depth -= 1
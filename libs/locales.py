@@ -3,11 +3,22 @@ import json
 import os
 import typing as p
 from collections import UserString
+from contextvars import ContextVar
 from copy import deepcopy
 
 from aiogram import types as t
 
 lang = None
+user_lang: ContextVar[tuple[int, str] | None] = ContextVar("user_lang", default=None)
+
+
+def set_user_lang(user: t.User, settings: dict):
+    """
+    Remember the user language for the current update, UserText can't query the database
+    """
+    from src.utils import get_value
+
+    user_lang.set((user.id, get_value(settings, ["lang"], user.language_code)))
 
 
 class TextEncoder(json.JSONEncoder):
@@ -60,15 +71,15 @@ class UserText:
     gettext: p.Callable[[str], str]
 
     def __init__(self):
-        from src.instances import Database
-        from src.utils import get_value
-
         user = t.User.get_current()
 
         self.lang = None
         if user:  # if user found
-            userOBJ = Database.get_user(user.id)
-            self.lang = get_value(userOBJ.settings, ["lang"], user.language_code)
+            current = user_lang.get()
+            if current and current[0] == user.id:
+                self.lang = current[1]
+            else:
+                self.lang = user.language_code
         else:
             self.lang = lang
 
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import bisect
+import functools
+import logging
+import re
+import sys
+import time
+import typing as p
+from datetime import timedelta
+
+# histogram bucket upper bounds in seconds, 50 µs to about 85 s, 25% apart
+BOUNDS = tuple(0.00005 * 1.25 ** n for n in range(65))
+# Database methods that only pass queries through, the caller is looked up above them
+INTERNAL = frozenset(("get", "get_batch", "update", "update_many", "measure"))
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAMS = re.compile(r"\((?:\s*%s\s*,)+\s*%s\s*\)")
+_ROWS = re.compile(r"(\(%s(?:,%s)*\))(?:\s*,\s*\1)+")
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize(sql: str) -> str:
+    """
+    Statement shape: literals and parameter lists of any length are folded
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _ROWS.sub(r"\1+", sql)
+    sql = _PARAMS.sub("(%s+)", sql)
+    return " ".join(sql.split())
+
+
+def caller(frame) -> str:
+    """
+    First frame above the pass-through and private methods, module qualified outside of libs.database
+    """
+    while frame is not None and (frame.f_code.co_name in INTERNAL or frame.f_code.co_name.startswith("_")):
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+
+    module = frame.f_globals.get("__name__", "")
+    if module == "libs.database":
+        return frame.f_code.co_name
+    return f"{module}.{frame.f_code.co_name}"
+
+
+class Histogram:
+    __slots__ = ("counts",)
+
+    counts: list[int]
+
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS) + 1)
+
+    def add(self, seconds: float):
+        self.counts[bisect.bisect_left(BOUNDS, seconds)] += 1
+
+    def __iadd__(self, other: "Histogram") -> "Histogram":
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        return self
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the quantile, so at most 25% above the real value
+        """
+        total = sum(self.counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for n, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return BOUNDS[min(n, len(BOUNDS) - 1)]
+        return BOUNDS[-1]
+
+
+class Entry:
+    __slots__ = ("count", "errors", "rows", "total", "max", "histogram")
+
+    count: int
+    errors: int
+    rows: int
+    total: float
+    max: float
+    histogram: Histogram
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = Histogram()
+
+    def __iadd__(self, other: "Entry") -> "Entry":
+        self.count += other.count
+        self.errors += other.errors
+        self.rows += other.rows
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.histogram += other.histogram
+        return self
+
+
+class QueryStat(p.NamedTuple):
+    name: str
+    count: int
+    errors: int
+    rows: int
+    total: float
+    p50: float
+    p95: float
+    p99: float
+    max: float
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class Measure:
+    """
+    Times one statement from checkout to the fetched result
+    """
+    __slots__ = ("metrics", "caller", "sql", "rows", "started")
+
+    metrics: "QueryMetrics"
+    caller: str
+    sql: str
+    rows: int
+    started: float
+
+    def __init__(self, metrics: "QueryMetrics", caller: str, sql: str):
+        self.metrics = metrics
+        self.caller = caller
+        self.sql = sql
+        self.rows = 0
+
+    def __enter__(self) -> "Measure":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.record(self.caller, self.sql, time.perf_counter() - self.started, self.rows, exc_type is not None)
+
+
+class QueryMetrics:
+    """
+    Count, latency histogram and rows per caller and statement shape
+    """
+    slow: float
+    _entries: dict[tuple[str, str], Entry]
+    since: float
+
+    def __init__(self, slow: timedelta = timedelta(milliseconds=500)):
+        self.slow = slow.total_seconds()
+        self._entries = {}
+        self.since = time.monotonic()
+
+    def measure(self, sql: str, args: p.Any = None) -> Measure:
+        name = caller(sys._getframe(1))
+        logging.debug("Query in %s:\n    %s %s", name, sql, args)
+        return Measure(self, name, sql)
+
+    def record(self, caller: str, sql: str, seconds: float, rows: int = 0, error: bool = False):
+        shape = normalize(sql)
+        entry = self._entries.get((caller, shape))
+        if entry is None:
+            entry = self._entries[caller, shape] = Entry()
+
+        entry.count += 1
+        entry.errors += error
+        entry.rows += rows
+        entry.total += seconds
+        entry.max = max(entry.max, seconds)
+        entry.histogram.add(seconds)
+
+        if seconds >= self.slow:
+            logging.warning(f"Slow query: {seconds * 1000:.0f} ms, {rows} rows in {caller}: {shape}")
+
+    def snapshot(self, by: p.Literal["caller", "shape"] = "caller") -> list[QueryStat]:
+        """
+        Stats grouped by the calling method or by the statement shape, most total time first
+        """
+        groups: dict[str, Entry] = {}
+        for (caller, shape), entry in self._entries.items():
+            name = caller if by == "caller" else shape
+            groups.setdefault(name, Entry())
+            groups[name] += entry
+
+        stats = [
+            QueryStat(
+                name,
+                e.count,
+                e.errors,
+                e.rows,
+                e.total,
+                e.histogram.quantile(0.5),
+                e.histogram.quantile(0.95),
+                e.histogram.quantile(0.99),
+                e.max
+            )
+            for name, e in groups.items()
+        ]
+        return sorted(stats, key=lambda s: s.total, reverse=True)
+
+    def reset(self):
+        self._entries.clear()
+        self.since = time.monotonic()
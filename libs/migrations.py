@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+import typing as p
+
+from libs.database import Query
+
+if p.TYPE_CHECKING:
+    from libs.database import Database
+
+MIGRATION_FILE = re.compile(r"^(?P<version>\d+)_(?P<name>\w+)\.sql$")
+
+
+class Migration:
+    version: int
+    name: str
+    path: str
+
+    def __init__(self, version: int, name: str, path: str):
+        self.version = version
+        self.name = name
+        self.path = path
+
+    @property
+    def statements(self) -> list[str]:
+        with open(self.path, "r") as file:
+            lines = [l for l in file.read().splitlines() if not l.strip().startswith("--")]
+
+        return [s.strip() for s in "\n".join(lines).split(";") if s.strip()]
+
+    def __str__(self):
+        return f"{self.version:04}_{self.name}"
+
+
+class Migrations:
+    """
+    Applies numbered `NNNN_name.sql` files from `path` in order, the applied versions are kept in schema_version
+    """
+    database: "Database"
+    path: str
+
+    LOCK = "toolkit_migrations"
+
+    def __init__(self, database: "Database", path: str = "data/migrations"):
+        self.database = database
+        self.path = path
+
+    @property
+    def migrations(self) -> list[Migration]:
+        result = []
+        for file in os.listdir(self.path):
+            match = MIGRATION_FILE.match(file)
+            if match:
+                result.append(Migration(
+                    int(match.group("version")),
+                    match.group("name"),
+                    os.path.join(self.path, file)
+                ))
+
+        return sorted(result, key=lambda m: m.version)
+
+    async def version(self) -> int:
+        result = await self.database.get("SELECT MAX(version) FROM schema_version", True)
+        return result[0] or 0
+
+    async def pending(self) -> list[Migration]:
+        version = await self.version()
+        return [m for m in self.migrations if m.version > version]
+
+    async def migrate(self) -> list[Migration]:
+        applied = []
+
+        # one connection for the whole run, GET_LOCK is held per connection
+        async with self.database.connection():
+            await self.database.update(
+                "CREATE TABLE IF NOT EXISTS schema_version ("
+                "version int NOT NULL PRIMARY KEY, "
+                "name varchar(255) NOT NULL, "
+                "applied datetime NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+            )
+            locked, = await self.database.get(Query("SELECT GET_LOCK(%s, 60)", (self.LOCK,)), True)
+            if locked != 1:  # 0 - timed out, NULL - error, another instance may be migrating
+                raise RuntimeError(f"Migration lock {self.LOCK!r} not acquired ({locked}), migrations not applied")
+            try:
+                for migration in await self.pending():
+                    logging.warning(f"Apply migration {migration}")
+                    for statement in migration.statements:
+                        await self.database.update(statement)
+                    await self.database.update(Query(
+                        "INSERT INTO schema_version(version, name) VALUES (%s, %s)",
+                        (migration.version, migration.name)
+                    ))
+                    applied.append(migration)
+            finally:
+                await self.database.get(Query("SELECT RELEASE_LOCK(%s)", (self.LOCK,)), True)
+
+        return applied
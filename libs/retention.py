@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import typing as p
+from datetime import date, timedelta
+
+from libs.database import Query
+
+if p.TYPE_CHECKING:
+    from libs.archive import Archive
+    from libs.database import Database
+
+# TO_DAYS() of date.fromordinal(1)
+TO_DAYS_OFFSET = 365
+
+
+def partition_name(bound: int) -> str:
+    """
+    Partitions are named after their upper bound, the first day they do not hold
+    """
+    return f"p{date.fromordinal(bound - TO_DAYS_OFFSET):%Y%m%d}"
+
+
+class Retention:
+    """
+    Messages are partitioned by day (migration 0003): days older than every chat's window are dropped whole,
+    chats with a shorter window are trimmed with one range delete each.
+    With an archive only the hot days stay in Messages, older ones are moved to segments before the drop
+    """
+    database: "Database"
+    archive: "Archive | None"
+    default: timedelta
+    maximum: timedelta
+    interval: timedelta
+    ahead: int
+
+    _task: asyncio.Task | None
+
+    TABLE = "Messages"
+    SIDE_TABLES = ("MessageSearch",)  # not partitioned, trimmed by date
+    SETTINGS = ("retention", "days")
+
+    def __init__(self,
+                 database: "Database",
+                 archive: "Archive | None" = None,
+                 default: timedelta = timedelta(days=7),
+                 maximum: timedelta = timedelta(days=30),
+                 interval: timedelta = timedelta(hours=1),
+                 ahead: int = 3):
+        self.database = database
+        self.archive = archive
+        self.default = default
+        self.maximum = maximum
+        self.interval = interval
+        self.ahead = ahead
+
+        self._task = None
+
+    def window(self, days: int | None) -> int:
+        if days is None:
+            return self.default.days
+        return max(1, min(int(days), self.maximum.days))
+
+    async def windows(self) -> dict[int, int]:
+        """
+        Chats with their own retention window, in days
+        """
+        path = "$." + ".".join(self.SETTINGS)
+        result = await self.database.get(Query(
+            "SELECT id, JSON_EXTRACT(settings, %s) FROM Chats WHERE JSON_EXTRACT(settings, %s) IS NOT NULL",
+            (path, path)
+        ))
+        return {id: self.window(days) for id, days in result}
+
+    async def partitions(self) -> dict[str, int | None]:
+        """
+        Partition name to its TO_DAYS upper bound, None for MAXVALUE
+        """
+        result = await self.database.get(Query(
+            "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION",
+            (self.TABLE,)
+        ))
+        return {name: None if bound == "MAXVALUE" else int(bound) for name, bound in result}
+
+    async def prepare(self, today: int, partitions: dict[str, int | None]) -> list[str]:
+        """
+        Split days up to `ahead` out of pmax, so it stays empty and the split only touches metadata
+        """
+        bounds = [b for b in partitions.values() if b is not None]
+        first = max(bounds) + 1 if bounds else today  # the first split keeps all history in one partition
+        new = list(range(first, today + self.ahead + 2))
+        if not new or "pmax" not in partitions:
+            return []
+
+        names = [partition_name(b) for b in new]
+        definitions = ",".join(f"PARTITION {n} VALUES LESS THAN ({b})" for n, b in zip(names, new))
+        await self.database.update(
+            f"ALTER TABLE {self.TABLE} REORGANIZE PARTITION pmax INTO "
+            f"({definitions},PARTITION pmax VALUES LESS THAN MAXVALUE)"
+        )
+        return names
+
+    async def expire(self, today: int, hot: int, horizon: int, partitions: dict[str, int | None]) -> list[str]:
+        """
+        Drop partitions that only hold days older than `hot`, archiving those some chat still keeps
+        """
+        names = [n for n, b in partitions.items() if b is not None and b <= today - hot]
+        if self.archive is not None:
+            for name in names:
+                if partitions[name] > today - horizon:
+                    await self.archive.archive(self.database, name)
+        if names:
+            await self.database.update(f"ALTER TABLE {self.TABLE} DROP PARTITION {','.join(names)}")
+        return names
+
+    async def trim(self, horizon: int, windows: dict[int, int], tables: p.Iterable[str]) -> int:
+        """
+        Range delete the days a chat keeps less than `horizon`, the rest is covered by expire
+        """
+        trimmed = 0
+        for chat_id, days in windows.items():
+            if days < horizon:
+                for table in tables:
+                    await self.database.update(Query(
+                        f"DELETE FROM {table} WHERE chat_id=%s AND date<CURDATE() - INTERVAL %s DAY",
+                        (chat_id, days)
+                    ))
+                trimmed += 1
+        return trimmed
+
+    async def expire_side(self, horizon: int):
+        for table in self.SIDE_TABLES:
+            await self.database.update(Query(
+                f"DELETE FROM {table} WHERE date<CURDATE() - INTERVAL %s DAY",
+                (horizon,)
+            ))
+
+    async def sweep(self):
+        partitions = await self.partitions()
+        if not partitions:
+            logging.warning(f"{self.TABLE} is not partitioned, retention skipped")
+            return
+
+        today = (await self.database.get("SELECT TO_DAYS(CURDATE())", True))[0]
+        windows = await self.windows()
+        horizon = max([self.default.days, *windows.values()])
+        # chats on the default window are never trimmed, so hot days can not outlast it
+        hot = min(horizon, self.default.days, self.archive.after.days) if self.archive is not None else horizon
+
+        created = await self.prepare(today, partitions)
+        dropped = await self.expire(today, hot, horizon, partitions)
+        await self.expire_side(horizon)
+        trimmed = await self.trim(hot, windows, (self.TABLE,))
+        await self.trim(horizon, windows, self.SIDE_TABLES)
+
+        removed = 0
+        if self.archive is not None:
+            removed = await asyncio.to_thread(
+                self.archive.expire,
+                date.fromordinal(today - TO_DAYS_OFFSET),
+                windows,
+                self.default.days
+            )
+
+        if created or dropped or trimmed or removed:
+            logging.warning(f"Retention: {len(created)} partitions created, {len(dropped)} dropped, "
+                            f"{trimmed} chats trimmed, {removed} segments removed")
+
+    async def run(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as ex:
+                logging.error(f"Retention sweep failed ({ex.__class__.__name__}:{ex})")
+            await asyncio.sleep(self.interval.total_seconds())
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,17 +1,29 @@
 from __future__ import annotations
 
 from datetime import timedelta
+from operator import attrgetter
 
 from aiogram import types as t, Bot
 
 from libs import errors as e, database as d
-from libs.database import userOBJ, LogType as l
+from libs.database import LogType as l
 from libs.locales import UserText
 from src.instances import Cache
 from src.instances import Database
 from src.utils import get_value
 
 
+def user_key(cls: type, auth: int | str | t.User) -> int | str:
+    """
+    User.create cache key: the id, or the username until it is resolved
+    """
+    if isinstance(auth, t.User):
+        return auth.id
+    if isinstance(auth, str):
+        return auth.lower().removeprefix("@")
+    return auth
+
+
 class User:
     """
     Пользователь
@@ -32,9 +44,9 @@ class User:
     MUTE = t.ChatPermissions(can_send_messages=False)
     UNMUTE = t.ChatPermissions(*[True] * 8)
 
-    def __init__(self, user: t.User):
+    def __init__(self, user: t.User, userOBJ: userOBJ):
         self.user = user
-        self.userOBJ = Database.get_user(user.id)
+        self.userOBJ = userOBJ
 
         self.id = user.id
         self.username = user.username
@@ -48,7 +60,13 @@ class User:
         self.permission = self.userOBJ.permission
 
     @classmethod
-    @Cache.register(timedelta(minutes=10))
+    @Cache.register(
+        timedelta(hours=1),
+        refresh_delta=timedelta(minutes=10),
+        max_size=10000,
+        key=user_key,
+        result_key=attrgetter("id")
+    )
     async def create(cls, auth: str | int | t.User) -> "User":
         from bot import client
 
@@ -57,7 +75,7 @@ class User:
         else:
             user = await client.get_users(auth)
 
-        return cls(user)
+        return cls(user, await Database.get_user(user.id))
 
     @property
     def full_name(self) -> str:
@@ -88,19 +106,18 @@ class User:
     def statistic_mode(self) -> int:
         return get_value(self.settings, ["statistic", "mode"], 1)
 
-    @property
-    def owns(self) -> list[d.chatOBJ]:
-        return Database.get_chats(owner_id=self.id)
+    async def owns(self) -> list[d.chatOBJ]:
+        return await Database.get_chats(owner_id=self.id)
 
     async def get_owns(self):
         from libs.chat import Chat
 
         owns: list[Chat] = []
-        for chat in self.owns:
+        for chat in await self.owns():
             try:
                 owns.append(await Chat.create(chat.id))
             except Exception as ex:
-                Database.delete_chat(chat.id)
+                await Database.delete_chats(id=chat.id)
                 await e.ForceError(f"⚠ {ex.args[0]}").answer()
 
         return owns
@@ -125,13 +142,13 @@ class User:
         bot = Bot.get_current()
         await bot.unban_chat_member(chat_id, self.id, only_if_banned=False)
 
-    def get_reports(self, chat: t.Chat):
+    async def get_reports(self, chat: t.Chat):
         from libs.chat import Chat
         chat: Chat
 
-        return len(Database.get_logs(
+        return await Database.count_logs(
             chat_id=chat.id,
             target_id=self.id,
             type=l.REPORT,
             delta=chat.report_delta
-        ))
+        )
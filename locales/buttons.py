@@ -10,6 +10,9 @@ statistic_title = _("Date only - Date of message will be saved (date) \n" +
                     "Full - Text and data of message will be saved (text and data) \n" +
                     "Current: {mode}")
 
+retention_title = _("How long message history is kept \n" +
+                    "Current: {days} days")
+
 add_alias = Button(
     _("Add alias"), "add_alias"
 )
@@ -50,6 +53,9 @@ class chat:
             check_poll
         )
 
+        search_previous = Button(_("◀"), "search_previous")
+        search_next = Button(_("▶"), "search_next")
+
 
 class private:
     class settings:
@@ -92,6 +98,16 @@ class private:
                     Button(_("Full"), "statistic:1")
                 ),
 
+                Property(
+                    retention_title,
+                    _("Message history"),
+                    "retention", row_width=3
+                ).add(
+                    Button(_("1 day"), "retention:1"),
+                    Button(_("7 days"), "retention:7"),
+                    Button(_("30 days"), "retention:30")
+                ),
+
                 Property(_("Choose what you want to customize"), _("Reports"),
                          "report", row_width=1).add(
                     set_report_command,
@@ -32,6 +32,7 @@ class commands:
         clear_history_flag = _(
             "🔥 Delete messages sent by the user") + "(-c --clear-history)"
         count = _("🔢 Count (2 - 1000)")
+        search = _("🔤 Text to search")
         reply = _("⤴ Reply to delete above")
 
         ban = [users, until, reason, poll, clear_history_flag]
@@ -42,6 +43,7 @@ class commands:
         purge = [count, reply]
         clear_history = [users, until]
         report = [users, reason]
+        search = [search]
 
     hide = c.Hide().add(
         c.Command("cancel", _("◀ To cancel"),
@@ -54,11 +56,12 @@ class commands:
     )
 
     private_commands = c.Private().add(
-        c.Command("settings", _("⚙ Settings"), _("Shows settings"))
+        c.Command("settings", _("⚙ Settings"), _("Shows settings")),
+        c.Command("stats", _("📊 Statistic"), _("Shows your messages for a period (/stats or /stats 30d)"))
     )
 
     chat_commands = c.AllChat().add(
-
+        c.Command("stats", _("📊 Statistic"), _("Shows chat statistic for a period (/stats or /stats 30d)"))
     )
 
     chat_admin_commands = c.AllAdmins().add(
@@ -70,7 +73,8 @@ class commands:
         c.Command("purge", _("🗑 Purge messages"), *_help_text.purge),
         c.Command("clear_history", _(
             "🔥 Delete messages sent by the user"), *_help_text.clear_history),
-        c.Command("report", _("‼️ Report user"), *_help_text.report)
+        c.Command("report", _("‼️ Report user"), *_help_text.report),
+        c.Command("search", _("🔎 Search messages"), *_help_text.search)
     )
 
 
@@ -98,6 +102,29 @@ class parsers:
         p.DateArg(_("Date"), dest="delta", default=timedelta(minutes=1))
     )
 
+    cache = p.CommandParser("cache", "Cache command").add(
+        p.FlagArg().add(
+            p.Flag("r", "reset", dest="reset", name="Reset flag"),
+        )
+    )
+
+    queries = p.CommandParser("queries", "Queries command").add(
+        p.FlagArg().add(
+            p.Flag("s", "shape", dest="shape", name="Shape flag"),
+            p.Flag("r", "reset", dest="reset", name="Reset flag"),
+        )
+    )
+
+    stats = p.CommandParser("stats", _("Statistic command")).add(
+        p.DateArg(
+            _("Date"),
+            dest="delta",
+            minimum=timedelta(days=1),
+            maximum=timedelta(days=30),  # the longest retention window, older days are not kept
+            default=timedelta(days=7)
+        )
+    )
+
     help = p.CommandParser("help", _("Help command")).add(
         p.TextArg(_("Command"), "cmd", sep="")
     )
@@ -139,6 +166,10 @@ class parsers:
         p.NumberArg(_("Message count"), 2, 1000, dest="count", required=True)
     )
 
+    search = p.CommandParser("search", _("Search command")).add(
+        p.TextArg(_("Text"), "query", required=True)
+    )
+
 
 command_list = c.Commands().add(
     commands.hide,
@@ -54,6 +54,7 @@ class private:
         alias_command = _("Send me command")
 
         statistic_mode_changed = _("Statistic mode changed on {mode}")
+        retention_changed = _("Message history is kept for {days} days")
 
         report_command = _(
             "Send me report command \nCurrent - {command} \n") + cancel
@@ -62,6 +63,14 @@ class private:
         report_delta = _(
             "Send me expire report time (from '1d' to '1y') \nCurrent - {delta} days \n") + cancel
 
+    class statistic:
+        title = _("📊 Your messages for {days} days - <b>{count}</b> \n")
+        empty = _("📊 You have no messages for {days} days")
+        by_chat = _("\nBy chat:\n")
+        by_type = _("\nBy type:\n")
+        by_day = _("\nBy day:\n")
+        sample = "   {name} - {count}\n"
+
 
 class chat:
     _perm = _("┣ /ban /unban ⛔ \n" +
@@ -122,3 +131,18 @@ class chat:
         reason_empty = _("Without any reasons")
 
         purge = _("🗑 Chat purged of {count} messages")
+
+        search = _("🔎 Results for <b>{query}</b>, page {page}:\n")
+        search_empty = _("🔎 Nothing found for <b>{query}</b>")
+        search_sample = "{n}. <a href='{link}'>{date}</a> {text}\n"
+
+    class statistic:
+        title = _("📊 Chat messages for {days} days - <b>{count}</b> \n" +
+                  "👥 Users - {users} \n" +
+                  "⤴ Replies - {replies}% \n" +
+                  "📏 Average length - {length} \n" +
+                  "🕒 Peak hour - {hour}:00 \n")
+        empty = _("📊 No messages for {days} days")
+        top_users = _("\nTop posters:\n")
+        lengths = _("\nLength:\n")
+        sample = "   {name} - {count}\n"
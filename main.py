@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import optparse
 import signal
@@ -24,6 +25,10 @@ parser.add_option('-i', '--init-commands',
                   action="store_true",
                   dest='commands',
                   help='Re init bot commands')
+parser.add_option('-M', '--migrate',
+                  action="store_true",
+                  dest='migrate',
+                  help='Apply database migrations and exit')
 values, args = parser.parse_args()
 
 if values.test:
@@ -43,6 +48,7 @@ other = locales.other
 MessageData = src.instances.MessageData
 langs = locales_config.langs
 locales = libs.locales
+UnitOfWorkMiddleware = src.utils.UnitOfWorkMiddleware
 NewInstanceMiddleware = src.utils.NewInstanceMiddleware
 LogMiddleware = src.utils.LogMiddleware
 
@@ -56,12 +62,28 @@ async def shutdown(dp: Dispatcher):
     logging.warning("Delete MessageData")
     await MessageData.close()
     await client.stop()
+    logging.warning("Flush message queue")
+    await src.instances.MessageWriter.close()
+    await src.instances.MessageStats.close()
+    await src.instances.SearchWriter.close()
+    await src.instances.Retention.close()
+    await src.instances.Cache.close()
+    await src.instances.Database.close()
     logging.warning(f"Bot stopped")
 
 
+async def migrate():
+    applied = await src.instances.Migrations.migrate()
+    logging.warning(f"Database migrated ({len(applied)} applied)")
+
+
 async def startup(dp: Dispatcher):
+    await migrate()
+    src.instances.Retention.start()
+    src.instances.Cache.start()
+
     config.bot = await dp.bot.get_me()
-    src.instances.Database.get_user(config.bot.id)
+    await src.instances.Database.get_user(config.bot.id)
 
     logging.warning("Start client")
     await client.start()
@@ -84,8 +106,13 @@ def dumps(data):
 
 
 if __name__ == "__main__":
+    if values.migrate:
+        asyncio.run(migrate())
+        exit()
+
     aiogram_json.dumps = dumps
     signal.signal(signal.SIGTERM, close)
+    dp.setup_middleware(UnitOfWorkMiddleware())
     dp.setup_middleware(NewInstanceMiddleware())
     dp.setup_middleware(LogMiddleware())
 
@@ -116,6 +116,9 @@ def config_generator():
     sql_user = _input("User")
     sql_password = _input("Password")
     sql_database = _input("Database name")
+    _clear()
+    print("Your telegram id, operator commands (/cache, /queries) only answer to it")
+    owner_id = _input("Owner id")
 
     with open("config.py", "r") as file:
         sample = file.read().format(
@@ -127,6 +130,7 @@ def config_generator():
             sql_password=sql_password,
             sql_database=sql_database,
             sql_host=sql_host,
+            owner_id=owner_id,
         )
 
     with open("data/docker/config.py", "w") as file:
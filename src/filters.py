@@ -4,6 +4,7 @@ from typing import Union
 from aiogram import types as t, filters as f, Bot
 from aiogram.types import ChatMemberStatus as s
 
+import config
 from bot import bot
 from libs import errors as e
 from . import regex as r
@@ -67,7 +68,7 @@ class AliasFilter(f.BoundFilter):
         if await message.is_private.check(msg):
             return False
 
-        aliases = get_aliases(msg)
+        aliases = await get_aliases(msg)
         text = get_alias_text(msg)
 
         for alias in aliases:
@@ -119,6 +120,14 @@ class user:
 
         return filter
 
+    @staticmethod
+    def is_operator(obj: objType):
+        """
+        The bot operator from `config.owner_id`, bot-wide commands only answer to them
+        """
+        user, chat = _helper.get_user_and_chat(obj)
+        return str(user.id) == str(config.owner_id)
+
     @staticmethod
     def add_member(upd: t.ChatMemberUpdated):
         old = upd.old_chat_member
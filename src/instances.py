@@ -1,8 +1,46 @@
+from datetime import timedelta
+
 import config
+from libs.analytics import Analytics
+from libs.archive import Archive
+from libs.batch import BatchWriter, RollupWriter
 from libs.cache import Cache
-from libs.database import Database
+from libs.database import Database, message_row, message_stat_row
 from libs.message import MessageData
+from libs.migrations import Migrations
+from libs.retention import Retention
 
 MessageData = MessageData()
-Database = Database(config.sql_user, config.sql_password, config.sql_host, config.sql_database)
-Cache = Cache()
+Archive = Archive("data/archive", after=timedelta(days=3))
+Database = Database(config.sql_user, config.sql_password, config.sql_host, config.sql_database, archive=Archive)
+Cache = Cache(scope=Database.unit_of_work)
+Migrations = Migrations(Database)
+Retention = Retention(Database, Archive)
+Analytics = Analytics(Database, window=Retention.maximum)
+MessageWriter = BatchWriter(
+    Database,
+    "Messages",
+    ["user_id", "chat_id", "message_id", "reply_message_id", "message", "type", "date"],
+    size=100,
+    delay=timedelta(milliseconds=500),
+    limit=10000,
+    prepare=message_row
+)
+SearchWriter = BatchWriter(
+    Database,
+    "MessageSearch",
+    ["chat_id", "message_id", "user_id", "date", "message"],
+    size=100,
+    delay=timedelta(milliseconds=500),
+    limit=10000
+)
+MessageStats = RollupWriter(
+    Database,
+    "MessageStats",
+    ["chat_id", "day", "user_id", "type"],
+    unique=["chat_id", "message_id"],
+    size=500,
+    delay=timedelta(seconds=5),
+    limit=10000,
+    prepare=message_stat_row
+)
@@ -1,3 +1,4 @@
+import sys
 import typing as p
 from copy import copy
 
@@ -6,9 +7,11 @@ from aiogram.dispatcher.middlewares import BaseMiddleware
 from aiogram.types import ContentType as c
 
 from bot import bot
-from libs.database import LogType as l
+from libs import errors as e
+from libs.database import LogType as l, UnitOfWork
+from libs.locales import set_user_lang
 from . import filters as f
-from .instances import Database
+from .instances import Analytics, Database, MessageWriter, MessageStats, SearchWriter
 
 
 async def get_help(msg: t.Message):
@@ -43,19 +46,20 @@ def get_value(_dict: dict, key_history: list, default: p.Any = None) -> p.Any:
     return result
 
 
-def save_target_settings(target):
+async def save_target_settings(target):
     from libs.chat import Chat
     from libs.user import User
 
     if isinstance(target, User):
         target.userOBJ.settings = target.settings
+        set_user_lang(target.user, target.settings)
     elif isinstance(target, Chat):
         target.chatOBJ.settings = target.settings
 
 
-def get_aliases(msg: t.Message) -> dict:
-    user_settings = Database.get_user(msg.from_user.id).settings
-    chat_settings = Database.get_chat(msg.chat.id).settings
+async def get_aliases(msg: t.Message) -> dict:
+    user_settings = (await Database.get_user(msg.from_user.id)).settings
+    chat_settings = (await Database.get_chat(msg.chat.id)).settings
 
     aliases = {}
     if msg.sticker:
@@ -89,7 +93,6 @@ def break_list_by_step(_list: list, step: int) -> list[list]:
 
 
 async def raise_permissions_errors(users: list[t.User], admins: list[t.ChatMember]):
-    from libs import errors as e
     from libs.user import User
 
     users: list[User]
@@ -118,6 +121,33 @@ async def raise_permissions_errors(users: list[t.User], admins: list[t.ChatMembe
             err = None
 
 
+class UnitOfWorkMiddleware(BaseMiddleware):
+    """
+    Database objects changed while handling an update are written once, after the handlers.
+    An update that failed drops them
+    """
+
+    def __init__(self):
+        super().__init__()
+
+    async def on_pre_process_update(self, upd: t.Update, data: dict):
+        work = Database.unit_of_work()
+        await work.__aenter__()
+        data["unit_of_work"] = work
+
+    async def on_pre_process_error(self, upd: t.Update, error: Exception, data: dict):
+        # errors handlers swallow the error, so the update's unit of work never sees it
+        work = UnitOfWork.current()
+        if work is not None:
+            work.discard()
+
+    async def on_post_process_update(self, upd: t.Update, result: list, data: dict):
+        work = data.pop("unit_of_work", None)
+        if work is not None:
+            # called from the handlers' `finally`, an error still propagating is the update's own
+            await work.__aexit__(*sys.exc_info())
+
+
 class NewInstanceMiddleware(BaseMiddleware):
     def __init__(self):
         self.check_types = [
@@ -143,11 +173,14 @@ class NewInstanceMiddleware(BaseMiddleware):
         from libs.chat import Chat
         from libs.user import User
 
+        user = e.MyError.get_user(upd)
+        if user:
+            set_user_lang(user, (await Database.get_user(user.id)).settings)
+
         msg = upd.message
         if msg:
-            if await f.message.is_chat.check(msg) and not Database.get_chat(msg.chat.id):
+            if await f.message.is_chat.check(msg) and not await Database.get_chat(msg.chat.id):
                 await Chat.create(msg.chat)
-            Database.get_user(msg.from_user.id)
 
             if msg.content_type in self.check_types and await f.message.is_chat.check(msg):
                 chat = await Chat.create(msg.chat)
@@ -168,7 +201,7 @@ class NewInstanceMiddleware(BaseMiddleware):
                 if mode <= 0:
                     text = None
 
-                Database.add_message(
+                await MessageWriter.add(
                     user_id=user_id,
                     chat_id=chat_id,
                     message_id=message_id,
@@ -177,6 +210,22 @@ class NewInstanceMiddleware(BaseMiddleware):
                     type=type,
                     date=date,
                 )
+                await MessageStats.add(
+                    user_id=user_id,
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    type=type,
+                    date=date,
+                )
+                if text:
+                    await SearchWriter.add(
+                        chat_id=chat_id,
+                        message_id=message_id,
+                        user_id=user_id,
+                        date=date,
+                        message=text,
+                    )
+                Analytics.append(chat_id, message_id, user_id, date, reply_message_id is not None, text)
 
 
 class LogMiddleware(BaseMiddleware):
@@ -189,16 +238,16 @@ class LogMiddleware(BaseMiddleware):
             member = upd.new_chat_member.user
 
             if f.user.promote_admin(upd):
-                Database.add_log(upd.chat.id, upd.from_user.id, member.id, l.PROMOTE_ADMIN, upd.date)
+                await Database.add_log(upd.chat.id, upd.from_user.id, member.id, l.PROMOTE_ADMIN, upd.date)
             if f.user.restrict_admin(upd):
-                Database.add_log(upd.chat.id, upd.from_user.id, member.id, l.RESTRICT_ADMIN, upd.date)
+                await Database.add_log(upd.chat.id, upd.from_user.id, member.id, l.RESTRICT_ADMIN, upd.date)
 
             if f.user.promote_member(upd):
-                Database.add_log(upd.chat.id, upd.from_user.id, member.id, l.PROMOTE_MEMBER, upd.date)
+                await Database.add_log(upd.chat.id, upd.from_user.id, member.id, l.PROMOTE_MEMBER, upd.date)
             if f.user.restrict_member(upd):
-                Database.add_log(upd.chat.id, upd.from_user.id, member.id, l.RESTRICT_MEMBER, upd.date)
+                await Database.add_log(upd.chat.id, upd.from_user.id, member.id, l.RESTRICT_MEMBER, upd.date)
 
             if f.user.add_member(upd):
-                Database.add_log(upd.chat.id, upd.from_user.id, member.id, l.ADD_MEMBER, upd.date)
+                await Database.add_log(upd.chat.id, upd.from_user.id, member.id, l.ADD_MEMBER, upd.date)
             if f.user.removed_member(upd):
-                Database.add_log(upd.chat.id, upd.from_user.id, member.id, l.REMOVE_MEMBER, upd.date)
+                await Database.add_log(upd.chat.id, upd.from_user.id, member.id, l.REMOVE_MEMBER, upd.date)
@@ -0,0 +1,6 @@
+import config
+
+# bot.py builds the clients on import, they only need well-formed values
+config.token = "123456:" + "A" * 35
+config.api_id = 1
+config.api_hash = "0" * 32
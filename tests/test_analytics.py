@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from libs.analytics import Analytics
+from libs.database import messageOBJ
+
+CHAT_ID = -1001
+
+
+class Messages:
+    """
+    Newest first in pages, like Database.iter_messages, with a pause between pages
+    """
+    def __init__(self, rows: list[messageOBJ]):
+        self.rows = rows
+        self.paused = asyncio.Event()
+        self.resume = asyncio.Event()
+
+    async def iter_messages(self, chat_id=None, delta=None, size=1000):
+        for n in range(0, len(self.rows), size):
+            for row in self.rows[n:n + size]:
+                yield row
+            if n == 0:
+                self.paused.set()
+                await self.resume.wait()
+
+
+def message(message_id: int, user_id: int, date: datetime) -> messageOBJ:
+    return messageOBJ(user_id, CHAT_ID, message_id, None, "text", 1, date)
+
+
+def test_load_keeps_appends_made_during_it():
+    now = datetime.now().replace(microsecond=0)
+    rows = [message(n, n % 3, now - timedelta(minutes=10 - n)) for n in range(10, 0, -1)]
+
+    async def scenario():
+        database = Messages(rows)
+        analytics = Analytics(database, page=4)
+        load = asyncio.create_task(analytics.columns(CHAT_ID))
+
+        await database.paused.wait()
+        analytics.append(CHAT_ID, 11, 7, now, text="new")
+        analytics.append(CHAT_ID, 10, 1, now)  # already loaded, dispatched again
+        database.resume.set()
+        return await load, analytics
+
+    columns, analytics = asyncio.run(scenario())
+
+    assert len(columns) == 11
+    assert columns.last_message_id == 11
+    assert list(columns.user_id) == [n % 3 for n in range(1, 11)] + [7]
+    assert list(columns.date) == sorted(columns.date)
+    assert not analytics._pending
@@ -0,0 +1,100 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from libs.archive import Archive, Segment, write_segment
+from libs.database import messageOBJ
+from src.instances import Database
+
+CHAT_ID = -1001
+TARGET_ID = 1
+OTHER_ID = 2
+
+
+def message(message_id: int, user_id: int, date: datetime) -> messageOBJ:
+    return messageOBJ(user_id, CHAT_ID, message_id, None, "text", 1, date)
+
+
+def test_clear_history_past_hot_window(monkeypatch, tmp_path):
+    archive = Archive(tmp_path, after=timedelta(days=3))
+    old = datetime.now().replace(microsecond=0) - timedelta(days=10)
+    path = tmp_path / str(CHAT_ID) / f"p{old.date() + timedelta(days=1):%Y%m%d}.seg"
+    write_segment(path, [message(1, TARGET_ID, old), message(2, OTHER_ID, old), message(3, TARGET_ID, old)])
+    updates = []
+
+    async def get(query, *args, **kwargs):
+        return [(10,)]  # the only target message still in Messages
+
+    async def update(query):
+        updates.append(query)
+
+    monkeypatch.setattr(Database, "archive", archive)
+    monkeypatch.setattr(Database, "get", get)
+    monkeypatch.setattr(Database, "update", update)
+
+    async def scenario():
+        # what clear_history looks up and purges with -time over the hot window
+        ids = await Database.get_message_ids(CHAT_ID, [TARGET_ID], timedelta(days=30))
+        assert sorted(ids) == [1, 3, 10]
+        await Database.delete_messages(chat_id=CHAT_ID, message_id=ids)
+        assert await Database.get_message_ids(CHAT_ID, [TARGET_ID], timedelta(days=30)) == [10]
+
+    asyncio.run(scenario())
+
+    assert updates
+    with Segment(CHAT_ID, path) as segment:
+        assert [row.message_id for row in segment.rows()] == [2]
+
+
+def test_deleted_user_leaves_archive(monkeypatch, tmp_path):
+    archive = Archive(tmp_path)
+    old = datetime.now().replace(microsecond=0) - timedelta(days=10)
+    path = tmp_path / str(CHAT_ID) / f"p{old.date() + timedelta(days=1):%Y%m%d}.seg"
+    write_segment(path, [message(1, TARGET_ID, old), message(2, TARGET_ID, old)])
+
+    async def update(query):
+        pass
+
+    monkeypatch.setattr(Database, "archive", archive)
+    monkeypatch.setattr(Database, "update", update)
+
+    asyncio.run(Database.delete_users(TARGET_ID))
+    assert not path.exists()
+
+
+def test_concurrent_deletes_keep_each_other(tmp_path):
+    archive = Archive(tmp_path)
+    old = datetime.now().replace(microsecond=0) - timedelta(days=10)
+    path = tmp_path / str(CHAT_ID) / f"p{old.date() + timedelta(days=1):%Y%m%d}.seg"
+    write_segment(path, [message(n, TARGET_ID, old) for n in range(1, 7)], block=2)
+
+    async def scenario():
+        return await asyncio.gather(
+            archive.delete(CHAT_ID, message_id=[1, 2]),
+            archive.delete(CHAT_ID, message_id=[5]),
+        )
+
+    assert asyncio.run(scenario()) == [2, 1]
+    with Segment(CHAT_ID, path) as segment:
+        assert [row.message_id for row in segment.rows()] == [6, 4, 3]
+    assert not list(path.parent.glob("*.tmp"))
+
+
+def test_delete_only_inflates_blocks_it_can_match(monkeypatch, tmp_path):
+    archive = Archive(tmp_path)
+    old = datetime.now().replace(microsecond=0) - timedelta(days=10)
+    path = tmp_path / str(CHAT_ID) / f"p{old.date() + timedelta(days=1):%Y%m%d}.seg"
+    write_segment(path, [message(n, TARGET_ID, old) for n in range(1, 9)], block=2)
+    inflated = []
+    block = Segment.block
+
+    def counted(self, n):
+        inflated.append(n)
+        return block(self, n)
+
+    monkeypatch.setattr(Segment, "block", counted)
+
+    assert asyncio.run(archive.delete(CHAT_ID, message_id=[20, 21])) == 0
+    assert asyncio.run(archive.delete(CHAT_ID, message_id=[3], user_id=OTHER_ID)) == 0
+    assert inflated == [1]
+    with Segment(CHAT_ID, path) as segment:
+        assert len(segment) == 8
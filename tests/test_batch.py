@@ -0,0 +1,59 @@
+import asyncio
+
+from libs.batch import BatchWriter, RollupWriter
+
+
+class Database:
+    """
+    update_many recorder, `failing` makes the next calls raise
+    """
+    def __init__(self):
+        self.rows = []
+        self.failing = 0
+
+    async def update_many(self, sql, rows):
+        if self.failing:
+            self.failing -= 1
+            raise ConnectionError("lost")
+        self.rows += rows
+
+
+def test_failed_flush_queues_rows_again():
+    database = Database()
+    writer = BatchWriter(database, "Messages", ["message_id"], size=10, limit=3)
+
+    async def scenario():
+        for n in range(2):
+            await writer.add(message_id=n)
+        database.failing = 1
+        await writer.flush()
+        assert writer.depth == 2
+
+        await writer.add(message_id=2)
+        database.failing = 2
+        await writer.add(message_id=3)  # the backpressure flush at the limit fails too
+        await writer.flush()
+        assert writer.depth == 3
+
+        await writer.close()
+
+    asyncio.run(scenario())
+    assert database.rows == [(1,), (2,), (3,)]
+    assert (writer.failures, writer.dropped, writer.depth) == (3, 1, 0)
+
+
+def test_failed_rollup_flush_keeps_counts():
+    database = Database()
+    writer = RollupWriter(database, "MessageStats", ["chat_id"], size=10)
+
+    async def scenario():
+        await writer.add(chat_id=1)
+        await writer.add(chat_id=1)
+        database.failing = 1
+        await writer.flush()
+        await writer.add(chat_id=1)
+        await writer.close()
+
+    asyncio.run(scenario())
+    assert database.rows == [(1, 3)]
+    assert writer.stats()["dropped"] == 0
@@ -0,0 +1,95 @@
+import asyncio
+from datetime import timedelta
+
+from aiogram import types as t
+
+from libs.cache import CacheGroup, key_gen
+from libs.chat import Chat
+from libs.database import chatOBJ, userOBJ
+from src.instances import Cache, Database
+
+CHAT_ID = -1001
+OWNER_ID = 1
+NEW_OWNER_ID = 2
+
+
+def test_group_stats_count_hits_misses_evictions():
+    group = CacheGroup(timedelta(hours=1), None, max_size=2)
+    for key in (1, 2, 3):
+        if group.get(key) is None:
+            group.add([key], key)
+    group.get(3)
+    group.get(1)
+
+    stats = group.stats()
+    assert (stats.size, stats.hits, stats.misses, stats.evictions, stats.expirations) == (2, 1, 4, 1, 0)
+    assert stats.hit_ratio == 0.2
+
+
+def test_key_gen_keeps_container_types():
+    keys = [
+        key_gen(([1, 2],), {}),
+        key_gen(((1, 2),), {}),
+        key_gen(({"a": 1},), {}),
+        key_gen((frozenset({("a", 1)}),), {}),
+        key_gen(({1},), {}),
+        key_gen((frozenset({1}),), {}),
+    ]
+    assert len(set(keys)) == len(keys)
+    assert key_gen(([1, {"a": [2]}],), {}) == key_gen(([1, {"a": [2]}],), {})
+    assert key_gen(({"a": [set()]},), {}) is not None
+
+
+def test_stale_chat_refresh_writes_owner(monkeypatch):
+    owner = {"id": OWNER_ID}
+    updates = []
+
+    async def get_administrators(self):
+        user = t.User(id=owner["id"], is_bot=False, first_name="Owner")
+        return [t.ChatMember(status=t.ChatMemberStatus.CREATOR, user=user)]
+
+    async def export_invite_link(self):
+        return None
+
+    async def get_user(id):
+        return userOBJ._make((id, "{}", "{}"))
+
+    async def get_chat(id, owner_id):
+        return chatOBJ._make((id, "{}", OWNER_ID))
+
+    async def update(query):
+        updates.append(query)
+
+    monkeypatch.setattr(t.Chat, "get_administrators", get_administrators)
+    monkeypatch.setattr(t.Chat, "export_invite_link", export_invite_link)
+    monkeypatch.setattr(Database, "get_user", get_user)
+    monkeypatch.setattr(Database, "get_chat", get_chat)
+    monkeypatch.setattr(Database, "update", update)
+    Cache.expire()
+
+    async def scenario():
+        chat = t.Chat(id=CHAT_ID, type=t.ChatType.SUPERGROUP, title="Chat")
+        async with Database.unit_of_work():
+            first = await Chat.create(chat)
+        assert not updates
+
+        group = Cache.get("Chat.create")
+        for entry in group._cache.values():
+            entry.refresh_at = 0
+        owner["id"] = NEW_OWNER_ID
+
+        # the unit of work of the update that started the refresh is closed before the refresh runs
+        async with Database.unit_of_work():
+            stale = await Chat.create(chat)
+        assert stale is first
+        await asyncio.gather(*group._loading.values())
+
+        assert (group.refreshes, group.refresh_failures) == (1, 0)
+        assert (await Chat.create(chat)).owner.id == NEW_OWNER_ID
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        Cache.expire()
+
+    assert [q for q in updates if "owner_id" in q.sql and NEW_OWNER_ID in q.args]
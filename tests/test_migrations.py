@@ -0,0 +1,44 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from libs.migrations import Migrations
+
+
+class Database:
+    def __init__(self, locked):
+        self.locked = locked
+        self.queries = []
+
+    @asynccontextmanager
+    async def connection(self):
+        yield None
+
+    async def update(self, query):
+        self.queries.append(getattr(query, "sql", query))
+
+    async def get(self, query, one=False):
+        self.queries.append(getattr(query, "sql", query))
+        if "GET_LOCK" in self.queries[-1]:
+            return (self.locked,)
+        return (None,)
+
+
+@pytest.mark.parametrize("locked", [0, None])
+def test_migrate_aborts_without_the_lock(tmp_path, locked):
+    (tmp_path / "0001_init.sql").write_text("CREATE TABLE t (id int);")
+    database = Database(locked)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(Migrations(database, str(tmp_path)).migrate())
+    assert not [q for q in database.queries if "CREATE TABLE t" in q or "RELEASE_LOCK" in q]
+
+
+def test_migrate_applies_under_the_lock(tmp_path):
+    (tmp_path / "0001_init.sql").write_text("CREATE TABLE t (id int);")
+    database = Database(1)
+
+    applied = asyncio.run(Migrations(database, str(tmp_path)).migrate())
+    assert [str(m) for m in applied] == ["0001_init"]
+    assert "RELEASE_LOCK" in database.queries[-1]
@@ -0,0 +1,103 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from libs.database import chatOBJ
+from src.instances import Database
+from src.utils import UnitOfWorkMiddleware
+
+CHAT_ID = -1001
+
+
+class Updates(list):
+    """
+    Recorded UPDATE queries, `failing` makes the next one raise
+    """
+    failing = False
+
+
+@pytest.fixture
+def updates(monkeypatch):
+    queries = Updates()
+
+    async def update(query):
+        if queries.failing:
+            queries.failing = False
+            raise ConnectionError("lost")
+        queries.append(query)
+
+    @asynccontextmanager
+    async def transaction():
+        yield None
+
+    monkeypatch.setattr(Database, "update", update)
+    monkeypatch.setattr(Database, "transaction", transaction)
+    return queries
+
+
+def chat() -> chatOBJ:
+    return chatOBJ._make((CHAT_ID, "{}", 1))
+
+
+def test_dropped_unit_of_work_forgets_changes(updates):
+    obj = chat()
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            async with Database.unit_of_work():
+                obj.owner_id = 2
+                obj.settings["lang"] = "en"
+                raise ValueError()
+        assert not obj.dirty and not obj.settings.changed
+
+        async with Database.unit_of_work():
+            obj.owner_id = 3
+
+    asyncio.run(scenario())
+    assert len(updates) == 1
+    assert "settings" not in updates[0].sql and 3 in updates[0].args
+
+
+def test_failed_write_stays_pending(updates):
+    obj = chat()
+
+    async def scenario():
+        updates.failing = True
+        with pytest.raises(ConnectionError):
+            async with Database.unit_of_work():
+                obj.owner_id = 2
+        assert obj.dirty
+
+        updates.failing = True
+        with pytest.raises(ConnectionError):
+            await obj.set("owner_id", 3)
+        assert obj.dirty
+
+        await obj.flush()
+
+    asyncio.run(scenario())
+    assert len(updates) == 1 and 3 in updates[0].args
+    assert not obj.dirty
+
+
+def test_middleware_drops_changes_of_a_failed_update(updates):
+    middleware = UnitOfWorkMiddleware()
+    obj = chat()
+
+    async def handle(error: Exception | None):
+        data = {}
+        await middleware.on_pre_process_update(None, data)
+        try:
+            obj.owner_id = 2
+            if error is not None:
+                raise error
+        finally:
+            await middleware.on_post_process_update(None, [], data)
+
+    with pytest.raises(ValueError):
+        asyncio.run(handle(ValueError()))
+    assert not updates and not obj.dirty
+
+    asyncio.run(handle(None))
+    assert len(updates) == 1